@@ -9,19 +9,364 @@ import json
 import pytz
 import random
 import math
+import bisect
+import heapq
+import io
+import csv
+from collections import defaultdict
+import time
+import queue
+import atexit
+import gzip
+import threading
+import functools
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import logging.handlers
+from collections import OrderedDict
 
 # Importation et configuration de Flask pour l'hébergement sur Render
-from flask import Flask
+from flask import Flask, jsonify, request
 from threading import Thread
 
 # Configuration du bot Discord
-intents = discord.Intents.all()
+# Mode "lean" (POXEL_LEAN_GATEWAY=1) : seuls les intents utiles sont demandés, le cache complet
+# des membres et les présences sont désactivés, et les membres sont récupérés à la demande
+# (par lots) dans un cache LRU borné. Ordre de grandeur de la mémoire résidente liée aux membres :
+#
+#   Taille du serveur | Mode complet (Intents.all) | Mode lean (LRU de MEMBER_CACHE_SIZE)
+#   1 000 membres     | ~2 Mo                      | ~1 Mo max
+#   10 000 membres    | ~20 Mo                     | ~2 Mo max
+#   100 000 membres   | ~200 Mo                    | ~2 Mo max
+#
+# Le mode complet garde chaque membre et sa présence (~2 Ko par membre) ; le mode lean ne garde
+# que les membres récemment utilisés (~1 Ko chacun), quel que soit le nombre de serveurs.
+LEAN_GATEWAY = os.environ.get('POXEL_LEAN_GATEWAY', '0') == '1'
+MEMBER_CACHE_SIZE = int(os.environ.get('POXEL_MEMBER_CACHE_SIZE', 2000))
+MEMBER_FETCH_BATCH_SIZE = 100
+if LEAN_GATEWAY:
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    intents.members = True
+    member_cache_flags = discord.MemberCacheFlags.none()
+else:
+    intents = discord.Intents.all()
+    member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
 BOT_PREFIX = "!"
 NEON_PURPLE = 0x6441a5
 NEON_BLUE = 0x027afa
 USER_TIMEZONE = pytz.timezone('Europe/Paris')
 SERVER_TIMEZONE = pytz.utc
 DATABASE_FILE = 'events_contests.json'
+EMBED_REFRESH_DELAY_SECONDS = 1.0
+LOG_LEVEL = os.environ.get('POXEL_LOG_LEVEL', 'INFO').upper()
+LOG_DEDUP_WINDOW_SECONDS = int(os.environ.get('POXEL_LOG_DEDUP_WINDOW', 60))
+LOG_FIELDS = ('event', 'contest', 'guild', 'phase')
+
+# --- Journalisation structurée (JSON lines) ---
+class JsonLineFormatter(logging.Formatter):
+    """Formate chaque entrée de journal en une ligne JSON avec les champs de contexte."""
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, SERVER_TIMEZONE).isoformat(),
+            "level": record.levelname,
+            "message": record.getMessage()
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class DuplicateLogFilter(logging.Filter):
+    """
+    Échantillonne les avertissements et erreurs répétés : un même message (même modèle,
+    mêmes champs de contexte) n'est émis qu'une fois par fenêtre, avec le nombre d'occurrences ignorées.
+    """
+    def __init__(self, window_seconds, max_keys=1000):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._seen = {}
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.levelno, record.msg) + tuple(getattr(record, field, None) for field in LOG_FIELDS)
+        now = time.monotonic()
+        seen = self._seen.get(key)
+        if seen and now - seen[0] < self.window_seconds:
+            seen[1] += 1
+            return False
+        record.suppressed = seen[1] if seen else 0
+        if len(self._seen) >= self.max_keys:
+            self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window_seconds}
+        self._seen[key] = [now, 0]
+        return True
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Dépose l'entrée telle quelle dans la file : le formatage se fait dans le thread d'écriture."""
+    def prepare(self, record):
+        return record
+
+def setup_logging():
+    """
+    Configure un journal asynchrone : les entrées sont déposées dans une file depuis la boucle
+    d'événements et écrites sur la sortie standard par un thread dédié.
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(DuplicateLogFilter(LOG_DEDUP_WINDOW_SECONDS))
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonLineFormatter())
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    poxel_logger = logging.getLogger('poxel')
+    poxel_logger.setLevel(LOG_LEVEL)
+    poxel_logger.addHandler(queue_handler)
+    poxel_logger.propagate = False
+    return poxel_logger
+
+logger = setup_logging()
+
+# --- Enregistrement de traces pour le rejeu (bot/replay.py) ---
+TRACE_FILE = os.environ.get('POXEL_TRACE_FILE')
+
+class TraceRecorder:
+    """
+    Enregistre, si POXEL_TRACE_FILE est défini, les entrées reçues par le bot (interactions,
+    commandes, créations, ticks) en lignes JSON compactes. La sérialisation se fait sur la boucle,
+    l'écriture dans le fichier par un thread dédié.
+    """
+    def __init__(self, path):
+        self.enabled = bool(path)
+        self._started = None
+        if not self.enabled: return
+
+        trace_queue = queue.SimpleQueue()
+        file_handler = logging.FileHandler(path, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter('%(message)s'))
+        listener = logging.handlers.QueueListener(trace_queue, file_handler)
+        listener.start()
+        atexit.register(listener.stop)
+
+        self._logger = logging.getLogger('poxel.trace')
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(DeferredQueueHandler(trace_queue))
+        self._logger.propagate = False
+
+    def start(self, now, data):
+        """Ouvre la trace avec l'heure ajustée courante et un instantané des données."""
+        if not self.enabled or self._started is not None: return
+        self._started = time.monotonic()
+        self.record('start', time=now.isoformat(), db=data)
+
+    def record(self, kind, **fields):
+        """Ajoute une entrée `kind` horodatée relativement au début de la trace."""
+        if not self.enabled or self._started is None: return
+        entry = {"t": round(time.monotonic() - self._started, 3), "k": kind, **fields}
+        self._logger.info(json.dumps(entry, separators=(',', ':'), ensure_ascii=False, default=str))
+
+trace = TraceRecorder(TRACE_FILE)
+
+# --- Archive de l'historique (événements et concours terminés) ---
+ARCHIVE_DIR = os.environ.get('POXEL_ARCHIVE_DIR', 'archive')
+# Les entrées sont regroupées avant compression : un bloc gzip est écrit toutes les
+# ARCHIVE_FLUSH_RECORDS entrées ou dès que ARCHIVE_FLUSH_SECONDS se sont écoulées depuis le dernier.
+ARCHIVE_FLUSH_RECORDS = int(os.environ.get('POXEL_ARCHIVE_FLUSH_RECORDS', '200'))
+ARCHIVE_FLUSH_SECONDS = int(os.environ.get('POXEL_ARCHIVE_FLUSH_SECONDS', '600'))
+
+class HistoryArchive:
+    """
+    Archive en ajout seul : un fichier JSONL compressé (gzip) par mois. Les nouvelles entrées sont
+    d'abord ajoutées en clair dans `pending.jsonl` (rien n'est perdu en cas d'arrêt brutal), puis
+    compressées par blocs ; un mois terminé est recompressé une fois en un seul flux.
+    L'index global ne contient que le nombre d'entrées par mois ; chaque mois a son propre petit
+    index (utilisateurs et serveurs présents) pour ne lire que les fichiers utiles lors d'une
+    recherche. Les accès sont protégés par un verrou car l'archive est utilisée par le bot et par
+    le serveur Flask.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._index = None
+        self._pending = None
+        self._last_flush = time.monotonic()
+
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _pending_path(self):
+        return os.path.join(self.directory, 'pending.jsonl')
+
+    def _month_path(self, month):
+        return os.path.join(self.directory, f"{month}.jsonl.gz")
+
+    def _month_index_path(self, month):
+        return os.path.join(self.directory, f"{month}.index.json")
+
+    def _write_json(self, path, payload):
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(payload, f)
+        os.replace(temp_path, path)
+
+    def _load_index(self):
+        if self._index is None:
+            if os.path.exists(self._index_path()):
+                with open(self._index_path(), 'r') as f:
+                    self._index = json.load(f)
+            else:
+                self._index = {"months": {}}
+            self._index.setdefault('compacted', [])
+        return self._index
+
+    def _load_month_index(self, month):
+        """Index du mois, ou None pour un mois archivé avant l'introduction des index mensuels."""
+        if os.path.exists(self._month_index_path(month)):
+            with open(self._month_index_path(month), 'r') as f:
+                return json.load(f)
+        return None
+
+    def _load_pending(self):
+        """Entrées pas encore compressées (rechargées depuis `pending.jsonl` au premier accès)."""
+        if self._pending is None:
+            self._pending = []
+            if os.path.exists(self._pending_path()):
+                with open(self._pending_path(), 'r', encoding='utf-8') as f:
+                    self._pending = [json.loads(line) for line in f if line.strip()]
+        return self._pending
+
+    def append(self, entry, line):
+        """Ajoute une entrée (et sa ligne JSON déjà sérialisée) ; compresse un bloc si nécessaire."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            pending = self._load_pending()
+            with open(self._pending_path(), 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            pending.append(entry)
+            if len(pending) >= ARCHIVE_FLUSH_RECORDS or time.monotonic() - self._last_flush >= ARCHIVE_FLUSH_SECONDS:
+                self._flush()
+
+    def flush(self):
+        """Compresse immédiatement les entrées en attente (appelé aussi à l'arrêt)."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        pending = self._load_pending()
+        if not pending:
+            return
+        by_month = defaultdict(list)
+        for entry in pending:
+            by_month[entry['archived_at'][:7]].append(entry)
+
+        index = self._load_index()
+        for month, entries in sorted(by_month.items()):
+            # Un seul membre gzip par bloc : la compression porte sur l'ensemble des entrées du bloc.
+            block = ''.join(json.dumps(entry, ensure_ascii=False, default=str) + '\n' for entry in entries)
+            with gzip.open(self._month_path(month), 'ab') as f:
+                f.write(block.encode('utf-8'))
+            month_index = self._load_month_index(month) or {"users": [], "guilds": []}
+            users, guilds = set(month_index['users']), set(month_index['guilds'])
+            for entry in entries:
+                users.update(entry['users'])
+                if entry.get('guild') is not None:
+                    guilds.add(entry['guild'])
+            self._write_json(self._month_index_path(month), {"users": sorted(users), "guilds": sorted(guilds)})
+            index['months'][month] = index['months'].get(month, 0) + len(entries)
+            if month in index['compacted']:
+                index['compacted'].remove(month)
+
+        # Les mois antérieurs au plus récent ne recevront plus d'entrées : un seul flux gzip par mois.
+        latest = max(index['months'])
+        for month in sorted(index['months']):
+            if month < latest and month not in index['compacted']:
+                self._compact(month)
+                index['compacted'].append(month)
+        self._write_json(self._index_path(), index)
+
+        self._pending = []
+        os.remove(self._pending_path())
+
+    def _compact(self, month):
+        with gzip.open(self._month_path(month), 'rb') as f:
+            content = f.read()
+        temp_path = self._month_path(month) + '.tmp'
+        with gzip.open(temp_path, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, self._month_path(month))
+
+    def query(self, guild_id, start=None, end=None, user_id=None, limit=50):
+        """
+        Renvoie les entrées archivées d'un serveur entre `start` et `end` (dates ISO 'AAAA-MM-JJ',
+        incluses), éventuellement limitées à un utilisateur, les plus récentes d'abord.
+        """
+        def matches(entry):
+            day = entry['archived_at'][:10]
+            if (start and day < start) or (end and day > end): return False
+            if entry.get('guild') != guild_id: return False
+            return user_id is None or user_id in entry['users']
+
+        with self._lock:
+            results = [entry for entry in reversed(self._load_pending()) if matches(entry)][:limit]
+            months = sorted(
+                (month for month in self._load_index()['months']
+                 if (not start or month >= start[:7]) and (not end or month <= end[:7])),
+                reverse=True
+            )
+            for month in months:
+                if len(results) >= limit:
+                    break
+                month_index = self._load_month_index(month)
+                if month_index is not None:
+                    if guild_id not in month_index['guilds']: continue
+                    if user_id is not None and user_id not in month_index['users']: continue
+                with gzip.open(self._month_path(month), 'rt', encoding='utf-8') as f:
+                    entries = [json.loads(line) for line in f]
+                for entry in reversed(entries):
+                    if matches(entry):
+                        results.append(entry)
+                        if len(results) >= limit:
+                            break
+            return results
+
+history_archive = HistoryArchive(ARCHIVE_DIR)
+# Un seul thread d'écriture : les ajouts restent ordonnés et n'occupent pas la boucle d'événements.
+archive_executor = ThreadPoolExecutor(max_workers=1)
+
+def close_archive():
+    """À l'arrêt : termine les écritures programmées puis compresse les entrées en attente."""
+    archive_executor.shutdown(wait=True)
+    history_archive.flush()
+
+atexit.register(close_archive)
+
+def archive_record(kind, name, data, outcome, **details):
+    """
+    Programme l'archivage d'un événement ou concours retiré de `db`.
+    `outcome` décrit la fin : 'finished', 'cancelled', 'drawn', 'message_deleted', 'channel_missing' ou 'error'.
+    """
+    archived_at = get_adjusted_time().isoformat()
+    user_ids = [p['id'] for p in data.get('participants', [])]
+    entry = {
+        "kind": kind, "name": name, "outcome": outcome, "archived_at": archived_at,
+        "guild": _guild_id_for_channel(data.get('announcement_channel_id')),
+        "users": user_ids, "data": data, **details
+    }
+    line = json.dumps(entry, ensure_ascii=False, default=str)
+    archive_executor.submit(history_archive.append, json.loads(line), line)
 
 def load_data():
     """
@@ -30,16 +375,80 @@ def load_data():
     """
     if os.path.exists(DATABASE_FILE):
         with open(DATABASE_FILE, 'r') as f:
-            return json.load(f)
-    return {"events": {}, "contests": {}, "settings": {"time_offset_seconds": 0}}
+            data = json.load(f)
+        data.setdefault('templates', {})
+        data.setdefault('stats', {})
+        return data
+    return {"events": {}, "contests": {}, "templates": {}, "stats": {}, "settings": {"time_offset_seconds": 0}}
 
 def save_data(data):
-    """Sauvegarde les données dans le fichier JSON."""
-    with open(DATABASE_FILE, 'w') as f:
+    """Sauvegarde les données dans le fichier JSON (écriture atomique via un fichier temporaire)."""
+    temp_file = DATABASE_FILE + '.tmp'
+    with open(temp_file, 'w') as f:
         json.dump(data, f, indent=4)
+    os.replace(temp_file, DATABASE_FILE)
 
 db = load_data()
 
+# --- Statistiques de participation ---
+STAT_FIELDS = ('events_joined', 'events_attended', 'contest_entries', 'contest_wins')
+LEADERBOARD_METRICS = STAT_FIELDS + ('activity',)
+
+class ParticipationStats:
+    """
+    Compteurs par serveur et par utilisateur, mis à jour à chaque inscription, désinscription,
+    démarrage d'événement et tirage. Ils sont stockés dans `db['stats']` sous forme compacte
+    ({serveur: {utilisateur: [inscriptions, présences, participations, victoires]}}), et chaque
+    classement est une liste triée maintenue par insertion, reconstruite une fois au démarrage.
+    """
+    def __init__(self, records):
+        self.records = records
+        self._boards = defaultdict(list)
+        self._lock = threading.Lock()
+        for guild_key, users in records.items():
+            for user_key, counters in users.items():
+                self._insert(guild_key, user_key, counters)
+
+    @staticmethod
+    def _metric_values(counters):
+        return dict(zip(LEADERBOARD_METRICS, (*counters, sum(counters))))
+
+    def _insert(self, guild_key, user_key, counters):
+        for metric, value in self._metric_values(counters).items():
+            bisect.insort(self._boards[(guild_key, metric)], (-value, user_key))
+
+    def _remove(self, guild_key, user_key, counters):
+        for metric, value in self._metric_values(counters).items():
+            board = self._boards[(guild_key, metric)]
+            del board[bisect.bisect_left(board, (-value, user_key))]
+
+    def record(self, guild_id, user_id, field, delta=1):
+        """Ajoute `delta` au compteur `field` de l'utilisateur (sans sauvegarder `db`)."""
+        if guild_id is None: return
+        guild_key, user_key = str(guild_id), str(user_id)
+        index = STAT_FIELDS.index(field)
+        with self._lock:
+            counters = self.records.setdefault(guild_key, {}).get(user_key)
+            if counters is None:
+                counters = self.records[guild_key][user_key] = [0] * len(STAT_FIELDS)
+            else:
+                self._remove(guild_key, user_key, counters)
+            counters[index] = max(0, counters[index] + delta)
+            self._insert(guild_key, user_key, counters)
+
+    def user_stats(self, guild_id, user_id):
+        """Renvoie les compteurs d'un utilisateur sur un serveur."""
+        counters = self.records.get(str(guild_id), {}).get(str(user_id), [0] * len(STAT_FIELDS))
+        return self._metric_values(counters)
+
+    def top(self, guild_id, metric='activity', limit=10):
+        """Renvoie les `limit` premiers (utilisateur, valeur) du classement `metric` d'un serveur."""
+        with self._lock:
+            board = self._boards.get((str(guild_id), metric), [])[:limit]
+        return [(int(user_key), -value) for value, user_key in board if value < 0]
+
+participation_stats = ParticipationStats(db['stats'])
+
 # --- Serveur Flask pour le maintien en vie du bot ---
 app = Flask(__name__)
 
@@ -48,6 +457,52 @@ def home():
     """Point de terminaison simple pour l'hébergement."""
     return "Poxel Bot is running!"
 
+# L'API du tableau de bord n'est active que si POXEL_DASHBOARD_TOKEN est défini ; chaque requête
+# doit alors fournir l'en-tête `Authorization: Bearer <jeton>`.
+DASHBOARD_TOKEN = os.environ.get('POXEL_DASHBOARD_TOKEN')
+
+def require_dashboard_token(view):
+    """Protège une route de l'API par le jeton du tableau de bord."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not DASHBOARD_TOKEN:
+            return jsonify({"error": "API désactivée (POXEL_DASHBOARD_TOKEN non défini)."}), 404
+        expected = f"Bearer {DASHBOARD_TOKEN}".encode('utf-8')
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'), expected):
+            return jsonify({"error": "Non autorisé."}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/api/guilds/<int:guild_id>/history')
+@require_dashboard_token
+def history(guild_id):
+    """Historique archivé d'un serveur : paramètres optionnels `from`, `to` (AAAA-MM-JJ), `user` et `limit`."""
+    try:
+        user_id = int(request.args['user']) if request.args.get('user') else None
+        limit = min(int(request.args.get('limit', 50)), 500)
+    except ValueError:
+        return jsonify({"error": "Paramètres invalides."}), 400
+    return jsonify(history_archive.query(guild_id, request.args.get('from'), request.args.get('to'), user_id, limit))
+
+@app.route('/api/guilds/<int:guild_id>/leaderboard')
+@require_dashboard_token
+def leaderboard(guild_id):
+    """Classement d'un serveur : paramètres optionnels `metric` et `limit`."""
+    metric = request.args.get('metric', 'activity')
+    if metric not in LEADERBOARD_METRICS:
+        return jsonify({"error": f"metric doit être l'une de : {', '.join(LEADERBOARD_METRICS)}."}), 400
+    try:
+        limit = min(int(request.args.get('limit', 10)), 100)
+    except ValueError:
+        return jsonify({"error": "Paramètres invalides."}), 400
+    return jsonify([{"user": user_id, "value": value} for user_id, value in participation_stats.top(guild_id, metric, limit)])
+
+@app.route('/api/guilds/<int:guild_id>/stats/<int:user_id>')
+@require_dashboard_token
+def user_stats(guild_id, user_id):
+    """Statistiques de participation d'un utilisateur sur un serveur."""
+    return jsonify(participation_stats.user_stats(guild_id, user_id))
+
 def run_flask():
     """Démarre le serveur Flask sur un thread séparé."""
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -93,18 +548,44 @@ def format_time_left(end_time_str):
     else:
         return f"{seconds} seconde(s)"
 
-async def update_event_embed(bot, event_name, interaction=None):
+def parse_hour_minute(time_str):
+    """Interprète une heure au format 'HHhMM'. Lève ValueError si le format est invalide."""
+    hour, minute = map(int, time_str.strip().split('h'))
+    return hour, minute
+
+def parse_duration(duration_str):
+    """Interprète une durée ('2h' ou '90min') en timedelta. Lève ValueError si le format est invalide."""
+    duration_str = duration_str.lower()
+    duration_value = int(''.join(filter(str.isdigit, duration_str)))
+    if 'min' in duration_str:
+        return datetime.timedelta(minutes=duration_value)
+    elif 'h' in duration_str:
+        return datetime.timedelta(hours=duration_value)
+    raise ValueError("Format de durée invalide")
+
+def parse_local_datetime(date_str, time_str):
+    """Interprète une date 'JJ/MM/AAAA' et une heure 'HHhMM' en heure de Paris. Lève ValueError si invalide."""
+    day, month, year = map(int, date_str.strip().split('/'))
+    hour, minute = parse_hour_minute(time_str)
+    return USER_TIMEZONE.localize(datetime.datetime(year, month, day, hour, minute))
+
+async def update_event_embed(bot, event_name, check_capacity=False):
     """
     Met à jour l'embed de l'événement avec les informations actuelles.
+    Si `check_capacity` est vrai, annonce la fermeture ou la réouverture des inscriptions.
     """
     if event_name not in db['events']: return
     event = db['events'][event_name]
+    # Une fois l'événement démarré, son message appartient au démarrage (embed "EN COURS", sans boutons) :
+    # un rafraîchissement programmé avant le démarrage ne doit pas le réécrire.
+    if event.get('is_started'): return
     announcement_channel_id = event['announcement_channel_id']
     message_id = event['message_id']
     try:
         channel = bot.get_channel(announcement_channel_id)
         if not channel: return
         message = await channel.fetch_message(message_id)
+        if event.get('is_started'): return
 
         embed = discord.Embed(
             title=f"NEW EVENT: {event_name}",
@@ -114,13 +595,10 @@ async def update_event_embed(bot, event_name, interaction=None):
         embed.add_field(name="POINT DE RALLIEMENT", value=f"<#{event['waiting_channel_id']}>", inline=True)
         embed.add_field(name="RÔLE ATTRIBUÉ", value=f"<@&{event['role_id']}>", inline=True)
         
-        if not event.get('is_started'):
-            start_time_utc = datetime.datetime.fromisoformat(event['start_time']).replace(tzinfo=SERVER_TIMEZONE)
-            start_time_paris = start_time_utc.astimezone(USER_TIMEZONE)
-            embed.add_field(name="DÉBUT PRÉVU", value=f"Le {start_time_paris.strftime('%d/%m/%Y')} à {start_time_paris.strftime('%Hh%M')}", inline=False)
-            embed.add_field(name="DÉBUT DANS", value=format_time_left(event['start_time']), inline=False)
-        else:
-            embed.add_field(name="TEMPS RESTANT", value=format_time_left(event['end_time']), inline=False)
+        start_time_utc = datetime.datetime.fromisoformat(event['start_time']).replace(tzinfo=SERVER_TIMEZONE)
+        start_time_paris = start_time_utc.astimezone(USER_TIMEZONE)
+        embed.add_field(name="DÉBUT PRÉVU", value=f"Le {start_time_paris.strftime('%d/%m/%Y')} à {start_time_paris.strftime('%Hh%M')}", inline=False)
+        embed.add_field(name="DÉBUT DANS", value=format_time_left(event['start_time']), inline=False)
         
         participants_list = "\n".join([f"- **{p['name']}** ({p['pseudo']})" for p in event['participants']])
         if not participants_list: participants_list = "Aucun participant pour le moment."
@@ -135,14 +613,14 @@ async def update_event_embed(bot, event_name, interaction=None):
         view = EventButtonsView(bot, event_name, event)
         await message.edit(embed=embed, view=view)
 
-        if interaction:
+        if check_capacity:
             old_participant_count = event.get('last_participant_count', 0)
             new_participant_count = len(event['participants'])
             max_participants = event.get('max_participants', 0)
 
-            if old_participant_count < max_participants and new_participant_count == max_participants:
+            if old_participant_count < max_participants <= new_participant_count:
                 await channel.send(f"@everyone ⛔ **INSCRIPTIONS CLOSES !** L'événement **{event_name}** a atteint son nombre maximum de participants.")
-            elif old_participant_count == max_participants and new_participant_count < max_participants:
+            elif old_participant_count >= max_participants > new_participant_count:
                 await channel.send(f"@everyone ✅ **RÉOUVERTURE !** Une place est disponible pour l'événement **{event_name}**.")
 
             event['last_participant_count'] = new_participant_count
@@ -150,15 +628,17 @@ async def update_event_embed(bot, event_name, interaction=None):
     
     except discord.NotFound:
         if event_name in db['events']:
-            del db['events'][event_name]
+            archive_record('event', event_name, db['events'].pop(event_name), 'message_deleted')
             save_data(db)
     except Exception as e:
-        print(f"Erreur lors de la mise à jour de l'embed pour {event_name}: {e}")
+        logger.error("Erreur lors de la mise à jour de l'embed : %s", e, extra={"event": event_name, "phase": "embed_update"})
 
 async def update_contest_embed(bot, contest_name):
     """Met à jour l'embed du concours."""
     if contest_name not in db['contests']: return
     contest = db['contests'][contest_name]
+    # Un concours terminé affiche le bouton de tirage (`TirageAdminView`) : ne pas le remplacer.
+    if contest.get('is_finished'): return
     announcement_channel_id = contest['announcement_channel_id']
     message_id = contest['message_id']
     
@@ -166,6 +646,7 @@ async def update_contest_embed(bot, contest_name):
         channel = bot.get_channel(announcement_channel_id)
         if not channel: return
         message = await channel.fetch_message(message_id)
+        if contest.get('is_finished'): return
 
         embed = discord.Embed(
             title=contest['title'],
@@ -188,13 +669,410 @@ async def update_contest_embed(bot, contest_name):
 
     except discord.NotFound:
         if contest_name in db['contests']:
-            del db['contests'][contest_name]
+            archive_record('contest', contest_name, db['contests'].pop(contest_name), 'message_deleted')
             save_data(db)
     except Exception as e:
-        print(f"Erreur lors de la mise à jour de l'embed du {contest_name}: {e}")
+        logger.error("Erreur lors de la mise à jour de l'embed : %s", e, extra={"contest": contest_name, "phase": "embed_update"})
+
+class EmbedRefreshDebouncer:
+    """
+    Regroupe les mises à jour d'embed demandées pour un même message.
+    La première demande programme une mise à jour après `delay` secondes ; les demandes
+    suivantes dans cette fenêtre sont absorbées, et la mise à jour affiche l'état final.
+    """
+    def __init__(self, delay):
+        self.delay = delay
+        self._pending = {}
+        self._tasks = set()
+
+    def schedule(self, key, refresh, **options):
+        """Programme `refresh(**options)` pour `key`, en fusionnant les options booléennes."""
+        if key in self._pending:
+            pending_options = self._pending[key][1]
+            for name, value in options.items():
+                pending_options[name] = pending_options.get(name, False) or value
+            return
+        self._pending[key] = (refresh, dict(options))
+        task = asyncio.create_task(self._run(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key):
+        await asyncio.sleep(self.delay)
+        refresh, options = self._pending.pop(key)
+        try:
+            await refresh(**options)
+        except Exception as e:
+            logger.error("Erreur lors de la mise à jour groupée de l'embed %s : %s", key, e, extra={"phase": "embed_refresh"})
+
+embed_refresher = EmbedRefreshDebouncer(EMBED_REFRESH_DELAY_SECONDS)
+
+def schedule_event_embed_refresh(bot, event_name, check_capacity=False):
+    """Programme une mise à jour groupée de l'embed d'un événement."""
+    event = db['events'].get(event_name)
+    if not event: return
+    embed_refresher.schedule(
+        ('event', event['message_id']),
+        lambda check_capacity: update_event_embed(bot, event_name, check_capacity=check_capacity),
+        check_capacity=check_capacity
+    )
+
+def schedule_contest_embed_refresh(bot, contest_name):
+    """Programme une mise à jour groupée de l'embed d'un concours."""
+    contest = db['contests'].get(contest_name)
+    if not contest: return
+    embed_refresher.schedule(('contest', contest['message_id']), lambda: update_contest_embed(bot, contest_name))
+
+class MemberLRUCache:
+    """Cache LRU borné des membres récupérés à la demande, indexé par (serveur, utilisateur)."""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._members = OrderedDict()
+
+    def get(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        member = self._members.get(key)
+        if member is not None:
+            self._members.move_to_end(key)
+        return member
+
+    def put(self, member):
+        key = (member.guild.id, member.id)
+        self._members[key] = member
+        self._members.move_to_end(key)
+        while len(self._members) > self.max_size:
+            self._members.popitem(last=False)
+
+member_cache = MemberLRUCache(MEMBER_CACHE_SIZE)
+
+async def resolve_members(guild, user_ids):
+    """
+    Renvoie un dictionnaire {id: membre} pour les utilisateurs encore présents sur le serveur.
+    Utilise le cache de discord.py, puis le cache LRU, puis interroge la passerelle par lots.
+    """
+    members = {}
+    missing = []
+    for user_id in dict.fromkeys(user_ids):
+        member = guild.get_member(user_id) or member_cache.get(guild.id, user_id)
+        if member:
+            members[user_id] = member
+        else:
+            missing.append(user_id)
+
+    for i in range(0, len(missing), MEMBER_FETCH_BATCH_SIZE):
+        batch = missing[i:i + MEMBER_FETCH_BATCH_SIZE]
+        try:
+            fetched = await guild.query_members(user_ids=batch, limit=len(batch), cache=False)
+        except (asyncio.TimeoutError, discord.ClientException) as e:
+            logger.warning("Impossible de récupérer les membres : %s", e, extra={"guild": guild.id, "phase": "member_fetch"})
+            continue
+        for member in fetched:
+            member_cache.put(member)
+            members[member.id] = member
+    return members
+
+def build_new_event_embed(event_name, event_data):
+    """Construit l'embed d'annonce d'un nouvel événement."""
+    embed = discord.Embed(title=f"NOUVEL ÉVÉNEMENT : {event_name}", description="Rejoignez-nous pour un événement spécial !", color=NEON_PURPLE)
+    embed.add_field(name="POINT DE RALLIEMENT", value=f"<#{event_data['waiting_channel_id']}>", inline=True)
+    embed.add_field(name="RÔLE ATTRIBUÉ", value=f"<@&{event_data['role_id']}>", inline=True)
+    start_time_paris = datetime.datetime.fromisoformat(event_data['start_time']).astimezone(USER_TIMEZONE)
+    embed.add_field(name="DÉBUT PRÉVU", value=f"Le {start_time_paris.strftime('%d/%m/%Y')} à {start_time_paris.strftime('%Hh%M')}", inline=False)
+    embed.add_field(name="DÉBUT DANS", value=format_time_left(event_data['start_time']), inline=False)
+    participants_list = "\n".join([f"- **{p['name']}** ({p['pseudo']})" for p in event_data['participants']])
+    embed.add_field(
+        name=f"PARTICIPANTS ({len(event_data['participants'])}/{event_data['max_participants']})",
+        value=participants_list or "Aucun participant pour le moment.",
+        inline=False
+    )
+    embed.set_image(url="https://i.imgur.com/uCgE04g.gif")
+    return embed
+
+async def send_event_announcement(bot, channel, event_name, event_data):
+    """Publie l'annonce d'un nouvel événement et renvoie le message."""
+    view = EventButtonsView(bot, event_name, event_data)
+    return await channel.send(content="@everyone", embed=build_new_event_embed(event_name, event_data), view=view)
+
+async def post_event_announcement(bot, channel, event_name, event_data):
+    """Publie l'annonce d'un événement et l'enregistre dans `db` (sans sauvegarder)."""
+    message = await send_event_announcement(bot, channel, event_name, event_data)
+    event_data['message_id'] = message.id
+    db['events'][event_name] = event_data
+    reminder_scheduler.schedule('event', event_name, event_data, get_adjusted_time())
+    return message
+
+async def send_contest_announcement(bot, channel, contest_name, contest_data):
+    """Publie l'annonce d'un nouveau concours et renvoie le message."""
+    end_time_paris = datetime.datetime.fromisoformat(contest_data['end_time']).astimezone(USER_TIMEZONE)
+    embed = discord.Embed(title=contest_name, description=contest_data['description'], color=NEON_BLUE)
+    embed.add_field(name="FIN DU CONCOURS", value=f"Le {end_time_paris.strftime('%d/%m/%Y')} à {end_time_paris.strftime('%H:%M')}", inline=False)
+    embed.add_field(name="TEMPS RESTANT", value=format_time_left(contest_data['end_time']), inline=False)
+    embed.add_field(name="INSCRITS", value="Aucun participant pour le moment.", inline=False)
+    view = ContestButtonsView(bot, contest_name, contest_data)
+    return await channel.send(content="@everyone 🏆 **NOUVEAU CONCOURS !**", embed=embed, view=view)
+
+# --- Rappels ---
+# Chaque événement (avant son début) et concours (avant sa fin) porte ses étapes de rappel en
+# minutes (`reminder_stages`) et celles déjà envoyées (`reminders_sent`). Les échéances sont
+# calculées une fois et rangées dans un tas : la boucle de rappels ne lit que les échéances dues.
+DEFAULT_REMINDER_STAGES_MINUTES = [int(m) for m in os.environ.get('POXEL_REMINDER_STAGES', '1440,60,10').split(',')]
+REMINDER_BATCH_WINDOW_SECONDS = 60
+REMINDER_GRACE_SECONDS = 300
+REMINDER_DM_INTERVAL_SECONDS = 0.5
+
+def parse_reminder_stages(stages_str):
+    """Interprète une liste d'étapes ('24h,1h,10min') en minutes, de la plus lointaine à la plus proche."""
+    stages = {int(parse_duration(stage.strip()).total_seconds() // 60) for stage in stages_str.split(',') if stage.strip()}
+    if not stages or min(stages) <= 0:
+        raise ValueError("Étapes de rappel invalides")
+    return sorted(stages, reverse=True)
+
+def format_reminder_stage(minutes):
+    if minutes % 1440 == 0:
+        return f"{minutes // 1440} jour(s)"
+    if minutes % 60 == 0:
+        return f"{minutes // 60} heure(s)"
+    return f"{minutes} minute(s)"
+
+class ReminderScheduler:
+    """Tas des prochaines échéances de rappel : (horodatage, type, nom, étape)."""
+    def __init__(self):
+        self._heap = []
+
+    def schedule(self, kind, name, data, now_utc, grace_seconds=0):
+        """
+        Ajoute les échéances encore à venir d'un événement ('event') ou d'un concours ('contest').
+        Une étape déjà échue est ignorée : à la création, une étape plus lointaine que l'échéance
+        de l'élément n'a pas de sens. Seule la reconstruction au démarrage accorde un délai de grâce
+        (`grace_seconds`) pour rattraper les rappels manqués pendant une courte coupure.
+        """
+        target = datetime.datetime.fromisoformat(data['start_time' if kind == 'event' else 'end_time']).replace(tzinfo=SERVER_TIMEZONE)
+        if target <= now_utc: return
+        for stage in data.get('reminder_stages', DEFAULT_REMINDER_STAGES_MINUTES):
+            if stage in data.get('reminders_sent', []): continue
+            due = target - datetime.timedelta(minutes=stage)
+            if (now_utc - due).total_seconds() >= grace_seconds: continue
+            heapq.heappush(self._heap, (due.timestamp(), kind, name, stage))
+
+    def rebuild(self, now_utc):
+        """Recalcule toutes les échéances à partir de `db` (au démarrage)."""
+        self._heap = []
+        for name, data in db['events'].items():
+            self.schedule('event', name, data, now_utc, REMINDER_GRACE_SECONDS)
+        for name, data in db['contests'].items():
+            self.schedule('contest', name, data, now_utc, REMINDER_GRACE_SECONDS)
+
+    def pop_due(self, now_utc, window_seconds):
+        """Retire et renvoie les échéances tombant avant `now_utc + window_seconds`."""
+        limit = now_utc.timestamp() + window_seconds
+        due = []
+        while self._heap and self._heap[0][0] <= limit:
+            due.append(heapq.heappop(self._heap))
+        return due
+
+reminder_scheduler = ReminderScheduler()
+
+def _pending_reminder_data(kind, name, stage):
+    """Renvoie les données de l'élément si le rappel `stage` est toujours à envoyer (les échéances obsolètes sont ignorées)."""
+    data = db['events' if kind == 'event' else 'contests'].get(name)
+    if not data or data.get('is_started') or data.get('is_finished'): return None
+    if stage not in data.get('reminder_stages', DEFAULT_REMINDER_STAGES_MINUTES): return None
+    if stage in data.setdefault('reminders_sent', []): return None
+    return data
+
+def format_reminder_line(kind, name, stage):
+    if kind == 'event':
+        return f"L'événement **{name}** commence dans {format_reminder_stage(stage)} !"
+    return f"Le concours **{name}** se termine dans {format_reminder_stage(stage)} !"
+
+def format_reminder_message(reminders):
+    """Regroupe les rappels d'un même salon en un seul message."""
+    if len(reminders) == 1:
+        kind, name, stage, _ = reminders[0]
+        return f"@everyone ⏰ **RAPPEL:** {format_reminder_line(kind, name, stage)} N'oubliez pas de vous inscrire."
+    lines = "\n".join(f"- {format_reminder_line(kind, name, stage)}" for kind, name, stage, _ in reminders)
+    return f"@everyone ⏰ **RAPPELS :**\n{lines}\nN'oubliez pas de vous inscrire."
+
+class ReminderDMWorker:
+    """
+    File des rappels en MP aux participants, envoyés un par un et espacés pour respecter les limites de Discord.
+    Chaque MP porte l'heure de début de son événement : il est abandonné si l'événement a commencé,
+    a été supprimé ou reprogrammé avant son tour.
+    """
+    def __init__(self, interval_seconds):
+        self.interval_seconds = interval_seconds
+        self.queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def enqueue_event(self, guild, event_name, stage, event_data):
+        members = await resolve_members(guild, [p['id'] for p in event_data['participants']])
+        text = f"⏰ **Rappel :** l'événement `{event_name}` commence dans {format_reminder_stage(stage)}. Rendez-vous dans le salon <#{event_data['waiting_channel_id']}>."
+        for member in members.values():
+            self.queue.put_nowait((member, text, event_name, guild.id, event_data['start_time']))
+
+    def _is_stale(self, event_name, start_time):
+        data = db['events'].get(event_name)
+        if not data or data.get('is_started') or data['start_time'] != start_time: return True
+        return get_adjusted_time() >= datetime.datetime.fromisoformat(start_time).replace(tzinfo=SERVER_TIMEZONE)
+
+    async def _run(self):
+        while True:
+            member, text, event_name, guild_id, start_time = await self.queue.get()
+            try:
+                if self._is_stale(event_name, start_time):
+                    logger.debug("Rappel en MP obsolète abandonné pour %s.", member.display_name, extra={"event": event_name, "guild": guild_id, "phase": "reminder_dm"})
+                    continue
+                try:
+                    await member.send(text)
+                except discord.Forbidden:
+                    logger.warning("Impossible d'envoyer un rappel en MP à %s (DMs bloqués).", member.display_name, extra={"event": event_name, "guild": guild_id, "phase": "reminder_dm"})
+                except discord.HTTPException as e:
+                    logger.warning("Erreur lors de l'envoi d'un rappel en MP : %s", e, extra={"event": event_name, "guild": guild_id, "phase": "reminder_dm"})
+                await asyncio.sleep(self.interval_seconds)
+            finally:
+                # Permet d'attendre la fin de la file (`queue.join()`), notamment lors d'un rejeu.
+                self.queue.task_done()
+
+reminder_dm_worker = ReminderDMWorker(REMINDER_DM_INTERVAL_SECONDS)
+
+# --- Événements récurrents ---
+# Un événement récurrent est stocké une seule fois dans `db['templates']`, avec la date de sa
+# prochaine occurrence. Les occurrences ne sont créées qu'en entrant dans l'horizon de
+# planification : l'état stocké et le coût de chaque vérification ne dépendent pas de
+# l'éloignement de la fin de la récurrence.
+RECURRENCE_HORIZON_HOURS = 24
+WEEKDAY_NAMES = ['lun', 'mar', 'mer', 'jeu', 'ven', 'sam', 'dim']
+# Les mots-clés anglais (`daily`, `weekly`) étant acceptés, les abréviations anglaises des jours le sont aussi.
+WEEKDAY_ALIASES = {
+    **{name: i for i, name in enumerate(WEEKDAY_NAMES)},
+    **{name: i for i, name in enumerate(['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun'])}
+}
+
+def parse_recurrence_rule(text, first_start_paris):
+    """
+    Interprète une règle de récurrence : `quotidien`, `hebdo` (même jour que la première occurrence),
+    `hebdo:lun,jeu` ou `Nj` (tous les N jours). Les équivalents anglais `daily`, `weekly` et
+    `weekly:mon,thu` sont aussi acceptés. Lève ValueError si la règle est invalide.
+    """
+    text = text.strip().lower()
+    if text in ('quotidien', 'daily'):
+        return {"freq": "daily", "interval": 1}
+    if text.startswith(('hebdo', 'weekly')):
+        _, _, days = text.partition(':')
+        if not days:
+            return {"freq": "weekly", "weekdays": [first_start_paris.weekday()]}
+        weekdays = set()
+        for day in days.split(','):
+            if day.strip()[:3] not in WEEKDAY_ALIASES:
+                raise ValueError(f"Jour inconnu : {day.strip()}")
+            weekdays.add(WEEKDAY_ALIASES[day.strip()[:3]])
+        weekdays = sorted(weekdays)
+        return {"freq": "weekly", "weekdays": weekdays}
+    if text.endswith('j') and text[:-1].strip().isdigit() and int(text[:-1]) > 0:
+        return {"freq": "custom", "interval": int(text[:-1])}
+    raise ValueError("Règle de récurrence invalide")
+
+def next_occurrence_start(template, previous_start_utc):
+    """Calcule le début (UTC) de l'occurrence qui suit `previous_start_utc`, à l'heure locale du modèle."""
+    rule = template['rule']
+    previous_date = previous_start_utc.astimezone(USER_TIMEZONE).date()
+    if rule['freq'] == 'weekly':
+        next_date = next(
+            previous_date + datetime.timedelta(days=offset) for offset in range(1, 8)
+            if (previous_date + datetime.timedelta(days=offset)).weekday() in rule['weekdays']
+        )
+    else:
+        next_date = previous_date + datetime.timedelta(days=rule['interval'])
+    hour, minute = map(int, template['start_time'].split('h'))
+    start_time_paris = USER_TIMEZONE.localize(datetime.datetime(next_date.year, next_date.month, next_date.day, hour, minute))
+    return start_time_paris.astimezone(SERVER_TIMEZONE)
+
+def _pending_occurrence_names(template_name):
+    """Renvoie les occurrences déjà annoncées du modèle qui n'ont pas encore commencé."""
+    return [name for name, data in db['events'].items() if data.get('template') == template_name and not data.get('is_started')]
+
+def pre_register_participants(event_data, participants):
+    """
+    Inscrit d'office les participants reportés qui ne le sont pas déjà, dans la limite des places.
+    Ces inscriptions comptent comme des inscriptions ordinaires dans les statistiques, pour que
+    la désinscription (qui les décompte) reste équilibrée.
+    """
+    registered = {p['id'] for p in event_data['participants']}
+    guild_id = _guild_id_for_channel(event_data['announcement_channel_id'])
+    added = []
+    for p in participants:
+        if len(event_data['participants']) >= event_data['max_participants']: break
+        if p['id'] in registered: continue
+        event_data['participants'].append(dict(p))
+        registered.add(p['id'])
+        added.append(p)
+        participation_stats.record(guild_id, p['id'], 'events_joined')
+    event_data['last_participant_count'] = len(event_data['participants'])
+    return added
+
+def carry_over_participants(bot, template_name, participants):
+    """
+    Point unique de report des inscriptions : appelé au démarrage d'une occurrence, il mémorise ses
+    participants dans le modèle et les inscrit à l'occurrence suivante si elle est déjà annoncée.
+    Une occurrence annoncée plus tard les reprend depuis le modèle (voir `expand_template`).
+    """
+    template = db['templates'].get(template_name)
+    if template is None: return
+    template['last_participants'] = [dict(p) for p in participants]
+    if not template.get('carry_over'): return
+    for occurrence_name in _pending_occurrence_names(template_name):
+        if pre_register_participants(db['events'][occurrence_name], template['last_participants']):
+            schedule_event_embed_refresh(bot, occurrence_name)
+
+async def expand_template(bot, template_name, template, now_utc):
+    """Crée les occurrences du modèle entrées dans l'horizon. Renvoie True si le modèle a changé."""
+    horizon = now_utc + datetime.timedelta(hours=RECURRENCE_HORIZON_HOURS)
+    changed = False
+    next_start = datetime.datetime.fromisoformat(template['next_start'])
+    while next_start <= horizon:
+        occurrence_name = f"{template_name} - {next_start.astimezone(USER_TIMEZONE).strftime('%d/%m/%Y')}"
+        channel = bot.get_channel(template['announcement_channel_id'])
+        # Les occurrences manquées (bot hors ligne) sont ignorées plutôt qu'annoncées en retard.
+        if next_start > now_utc and channel and occurrence_name not in db['events']:
+            event_data = {
+                "start_time": next_start.isoformat(),
+                "end_time": (next_start + datetime.timedelta(minutes=template['duration_minutes'])).isoformat(),
+                "role_id": template['role_id'],
+                "announcement_channel_id": template['announcement_channel_id'],
+                "waiting_channel_id": template['waiting_channel_id'],
+                "max_participants": template['max_participants'],
+                "participants": [], "last_participant_count": 0, "is_started": False,
+                "message_id": None, "template": template_name,
+                "reminder_stages": list(template.get('reminder_stages', DEFAULT_REMINDER_STAGES_MINUTES)), "reminders_sent": []
+            }
+            # Les inscriptions ne sont reprises du modèle que si l'occurrence précédente a déjà commencé ;
+            # sinon, c'est son démarrage qui les reportera (voir `carry_over_participants`).
+            if template.get('carry_over') and not _pending_occurrence_names(template_name):
+                pre_register_participants(event_data, template['last_participants'])
+            await post_event_announcement(bot, channel, occurrence_name, event_data)
+        next_start = next_occurrence_start(template, next_start)
+        template['next_start'] = next_start.isoformat()
+        changed = True
+    return changed
 
 # --- Classes de MODALS et VUES (UI) ---
 
+def event_registration_open(event_data):
+    """Vrai tant que l'événement n'a pas commencé : inscriptions et désinscriptions sont alors possibles."""
+    if event_data.get('is_started'): return False
+    start_time_utc = datetime.datetime.fromisoformat(event_data['start_time']).replace(tzinfo=SERVER_TIMEZONE)
+    return get_adjusted_time() < start_time_utc
+
+def contest_registration_open(contest_data):
+    """Vrai tant que le concours n'est pas terminé."""
+    if contest_data.get('is_finished'): return False
+    end_time_utc = datetime.datetime.fromisoformat(contest_data['end_time']).replace(tzinfo=SERVER_TIMEZONE)
+    return get_adjusted_time() < end_time_utc
+
 class ParticipantModal(Modal, title="Vérification de votre pseudo"):
     """Fenêtre modale pour que l'utilisateur entre son pseudo de jeu."""
     game_pseudo = TextInput(
@@ -211,18 +1089,32 @@ class ParticipantModal(Modal, title="Vérification de votre pseudo"):
         """Ajoute le participant à l'événement et met à jour l'embed."""
         user = interaction.user
         game_pseudo = self.game_pseudo.value
+        trace.record('join_submit', event=self.event_name, user=user.id, name=user.display_name, pseudo=game_pseudo)
         if not game_pseudo:
             game_pseudo = user.display_name
+
+        # L'embed n'est mis à jour qu'après le regroupement : le nombre de places est revérifié ici.
+        if not event_registration_open(self.view.event_data):
+            await interaction.response.send_message("Les inscriptions sont closes : l'événement a commencé.", ephemeral=True)
+            return
+        participants = self.view.event_data['participants']
+        if user.id in [p['id'] for p in participants]:
+            await interaction.response.send_message("Vous êtes déjà inscrit à cet événement !", ephemeral=True)
+            return
+        if len(participants) >= self.view.event_data.get('max_participants', 10):
+            await interaction.response.send_message("Les inscriptions sont closes : l'événement est complet.", ephemeral=True)
+            return
         
         self.view.event_data['participants'].append({
             "id": user.id,
             "name": user.display_name,
             "pseudo": game_pseudo
         })
-        save_data(db)
         
-        await update_event_embed(self.view.bot, self.event_name, interaction=interaction)
         await interaction.response.send_message(f"Vous avez été inscrit à l'événement `{self.event_name}` avec le pseudo `{game_pseudo}`.", ephemeral=True)
+        participation_stats.record(interaction.guild_id, user.id, 'events_joined')
+        save_data(db)
+        schedule_event_embed_refresh(self.view.bot, self.event_name, check_capacity=True)
 
 class EventButtonsView(View):
     """Vue pour les boutons d'inscription aux événements."""
@@ -250,9 +1142,16 @@ class EventButtonsView(View):
     async def on_join_click(self, interaction: discord.Interaction):
         """Gère l'inscription d'un utilisateur."""
         user = interaction.user
+        trace.record('join_click', event=self.event_name, user=user.id, name=user.display_name)
+        if not event_registration_open(self.event_data):
+            await interaction.response.send_message("Les inscriptions sont closes : l'événement a commencé.", ephemeral=True)
+            return
         if user.id in [p['id'] for p in self.event_data['participants']]:
             await interaction.response.send_message("Vous êtes déjà inscrit à cet événement !", ephemeral=True)
             return
+        if len(self.event_data['participants']) >= self.event_data.get('max_participants', 10):
+            await interaction.response.send_message("Les inscriptions sont closes : l'événement est complet.", ephemeral=True)
+            return
         
         modal = ParticipantModal(self, self.event_name)
         await interaction.response.send_modal(modal)
@@ -260,15 +1159,20 @@ class EventButtonsView(View):
     async def on_quit_click(self, interaction: discord.Interaction):
         """Gère la désinscription d'un utilisateur."""
         user_id = interaction.user.id
+        trace.record('quit_click', event=self.event_name, user=user_id, name=interaction.user.display_name)
+        if not event_registration_open(self.event_data):
+            await interaction.response.send_message("L'événement a commencé : il n'est plus possible de se désinscrire.", ephemeral=True)
+            return
         if user_id not in [p['id'] for p in self.event_data['participants']]:
             await interaction.response.send_message("Vous n'êtes pas inscrit à cet événement.", ephemeral=True)
             return
             
         self.event_data['participants'] = [p for p in self.event_data['participants'] if p['id'] != user_id]
-        save_data(db)
         
-        await update_event_embed(self.bot, self.event_name, interaction=interaction)
         await interaction.response.send_message("Vous vous êtes désinscrit de l'événement.", ephemeral=True)
+        participation_stats.record(interaction.guild_id, user_id, 'events_joined', -1)
+        save_data(db)
+        schedule_event_embed_refresh(self.bot, self.event_name, check_capacity=True)
 
 class ContestButtonsView(View):
     """Vue pour le bouton d'inscription aux concours."""
@@ -285,15 +1189,20 @@ class ContestButtonsView(View):
     async def on_start_click(self, interaction: discord.Interaction):
         """Gère l'inscription au concours."""
         user = interaction.user
+        trace.record('contest_join', contest=self.contest_name, user=user.id, name=user.display_name)
+        if not contest_registration_open(self.contest_data):
+            await interaction.response.send_message("Les inscriptions sont closes : le concours est terminé.", ephemeral=True)
+            return
         if user.id in [p['id'] for p in self.contest_data['participants']]:
             await interaction.response.send_message("Vous êtes déjà inscrit à ce concours !", ephemeral=True)
             return
             
         self.contest_data['participants'].append({"id": user.id, "name": user.display_name})
-        save_data(db)
         
-        await update_contest_embed(self.bot, self.contest_name)
         await interaction.response.send_message("Vous êtes inscrit au concours !", ephemeral=True)
+        participation_stats.record(interaction.guild_id, user.id, 'contest_entries')
+        save_data(db)
+        schedule_contest_embed_refresh(self.bot, self.contest_name)
 
 class ContestConfigModal(Modal, title="Configurer le Concours"):
     end_date_str = TextInput(label="Date de fin (JJ/MM/AAAA)", placeholder="Ex: 31/12/2025")
@@ -307,16 +1216,18 @@ class ContestConfigModal(Modal, title="Configurer le Concours"):
         self.channel_id = channel_id
 
     async def on_submit(self, interaction: discord.Interaction):
+        trace.record(
+            'contest_create', guild=interaction.guild_id, channel=self.channel_id, user=interaction.user.id,
+            title=self.title_input.value, description=self.description_input.value,
+            end_date=self.end_date_str.value, end_time=self.end_time_str.value
+        )
         try:
             contest_name = self.title_input.value.strip()
             if contest_name in db['contests']:
                 await interaction.response.send_message(f"Un concours nommé `{contest_name}` existe déjà.", ephemeral=True, delete_after=10)
                 return
 
-            day, month, year = map(int, self.end_date_str.value.split('/'))
-            hour, minute = map(int, self.end_time_str.value.split('h'))
-            end_time_naive = datetime.datetime(year, month, day, hour, minute)
-            end_time_localized = USER_TIMEZONE.localize(end_time_naive)
+            end_time_localized = parse_local_datetime(self.end_date_str.value, self.end_time_str.value)
             end_time_utc = end_time_localized.astimezone(SERVER_TIMEZONE)
 
             if end_time_utc < get_adjusted_time():
@@ -339,19 +1250,15 @@ class ContestConfigModal(Modal, title="Configurer le Concours"):
             "participants": [],
             "announcement_channel_id": self.channel_id,
             "message_id": None,
-            "is_finished": False
+            "is_finished": False,
+            "reminder_stages": list(DEFAULT_REMINDER_STAGES_MINUTES), "reminders_sent": []
         }
         
-        embed = discord.Embed(title=contest_name, description=self.description_input.value, color=NEON_BLUE)
-        embed.add_field(name="FIN DU CONCOURS", value=f"Le {end_time_localized.strftime('%d/%m/%Y')} à {end_time_localized.strftime('%H:%M')}", inline=False)
-        embed.add_field(name="TEMPS RESTANT", value=format_time_left(contest_data['end_time']), inline=False)
-        embed.add_field(name="INSCRITS", value="Aucun participant pour le moment.", inline=False)
-        
-        view = ContestButtonsView(self.bot, contest_name, contest_data)
-        message = await announcement_channel.send(content="@everyone 🏆 **NOUVEAU CONCOURS !**", embed=embed, view=view)
+        message = await send_contest_announcement(self.bot, announcement_channel, contest_name, contest_data)
         
         contest_data['message_id'] = message.id
         db['contests'][contest_name] = contest_data
+        reminder_scheduler.schedule('contest', contest_name, contest_data, get_adjusted_time())
         save_data(db)
         
         await interaction.response.send_message(f"Le concours `{contest_name}` a été créé avec succès !", ephemeral=True, delete_after=10)
@@ -398,6 +1305,7 @@ class TirageAdminView(View):
 
     @discord.ui.button(label="Tirage au sort", style=discord.ButtonStyle.success, emoji="🏆")
     async def raffle_button(self, interaction: discord.Interaction, button: Button):
+        trace.record('raffle_click', contest=self.contest_name, guild=interaction.guild_id, channel=interaction.channel_id, user=interaction.user.id)
         await interaction.response.defer(ephemeral=True)
         result_message = await _do_raffle_logic(interaction.guild, interaction.channel, interaction.user, self.contest_name)
         await interaction.followup.send(result_message, ephemeral=True)
@@ -457,6 +1365,7 @@ class CreateEventViewStep2(View):
         self.waiting_channel_id = None
         self.role_id = None
         self.max_participants = None
+        self.carry_over = False
         self.message = None
         self.add_item(AnnounceChannelSelect())
         self.add_item(WaitingChannelSelect())
@@ -466,6 +1375,11 @@ class CreateEventViewStep2(View):
         self.set_participants_button.callback = self.set_participants_callback
         self.add_item(self.set_participants_button)
 
+        if self.step1_data.get('recurrence'):
+            self.carry_over_button = Button(label="Réinscription automatique : NON", style=discord.ButtonStyle.secondary, row=3)
+            self.carry_over_button.callback = self.carry_over_callback
+            self.add_item(self.carry_over_button)
+
         self.confirm_button = Button(label="Créer l'événement", style=discord.ButtonStyle.primary, row=4, disabled=True)
         self.confirm_button.callback = self.confirm_callback
         self.add_item(self.confirm_button)
@@ -483,16 +1397,46 @@ class CreateEventViewStep2(View):
     async def set_participants_callback(self, interaction: discord.Interaction):
         await interaction.response.send_modal(MaxParticipantsModal(target_view=self))
 
+    async def carry_over_callback(self, interaction: discord.Interaction):
+        self.carry_over = not self.carry_over
+        self.carry_over_button.label = f"Réinscription automatique : {'OUI' if self.carry_over else 'NON'}"
+        self.carry_over_button.style = discord.ButtonStyle.success if self.carry_over else discord.ButtonStyle.secondary
+        await interaction.response.edit_message(view=self)
+
     async def confirm_callback(self, interaction: discord.Interaction):
+        trace.record(
+            'event_create', guild=interaction.guild_id, user=interaction.user.id, event=self.step1_data['event_name'],
+            start=self.step1_data['start_time_utc'].isoformat(), end=self.step1_data['end_time_utc'].isoformat(),
+            announce=self.announcement_channel_id, waiting=self.waiting_channel_id, role=self.role_id,
+            max=self.max_participants, recurrence=self.step1_data.get('recurrence'), carry_over=self.carry_over
+        )
         await interaction.response.defer(ephemeral=True)
         event_name = self.step1_data['event_name']
+        recurrence = self.step1_data.get('recurrence')
+        if recurrence:
+            if event_name in db['templates']:
+                await interaction.followup.send(f"Un événement récurrent nommé `{event_name}` existe déjà."); return
+
+            db['templates'][event_name] = {
+                "rule": recurrence,
+                "start_time": self.step1_data['start_time_utc'].astimezone(USER_TIMEZONE).strftime('%Hh%M'),
+                "duration_minutes": int((self.step1_data['end_time_utc'] - self.step1_data['start_time_utc']).total_seconds() // 60),
+                "next_start": self.step1_data['start_time_utc'].isoformat(),
+                "role_id": self.role_id,
+                "announcement_channel_id": self.announcement_channel_id,
+                "waiting_channel_id": self.waiting_channel_id,
+                "max_participants": self.max_participants,
+                "carry_over": self.carry_over,
+                "last_participants": []
+            }
+            save_data(db)
+            await self.message.delete()
+            await interaction.followup.send(f"L'événement récurrent `{event_name}` a été créé ! Chaque occurrence sera annoncée {RECURRENCE_HORIZON_HOURS}h avant son début.")
+            return
+
         if event_name in db['events']:
             await interaction.followup.send(f"Un événement nommé `{event_name}` existe déjà."); return
 
-        announcement_channel_obj = interaction.guild.get_channel(self.announcement_channel_id)
-        waiting_channel_obj = interaction.guild.get_channel(self.waiting_channel_id)
-        role_obj = interaction.guild.get_role(self.role_id)
-        
         event_data = {
             "start_time": self.step1_data['start_time_utc'].isoformat(),
             "end_time": self.step1_data['end_time_utc'].isoformat(),
@@ -501,23 +1445,9 @@ class CreateEventViewStep2(View):
             "waiting_channel_id": self.waiting_channel_id,
             "max_participants": self.max_participants,
             "participants": [], "last_participant_count": 0, "is_started": False,
-            "message_id": None, "reminded_30m": False
+            "message_id": None, "reminder_stages": list(DEFAULT_REMINDER_STAGES_MINUTES), "reminders_sent": []
         }
-
-        embed = discord.Embed(title=f"NOUVEL ÉVÉNEMENT : {event_name}", description="Rejoignez-nous pour un événement spécial !", color=NEON_PURPLE)
-        embed.add_field(name="POINT DE RALLIEMENT", value=waiting_channel_obj.mention, inline=True)
-        embed.add_field(name="RÔLE ATTRIBUÉ", value=role_obj.mention, inline=True)
-        start_time_paris = self.step1_data['start_time_utc'].astimezone(USER_TIMEZONE)
-        embed.add_field(name="DÉBUT PRÉVU", value=f"Le {start_time_paris.strftime('%d/%m/%Y')} à {start_time_paris.strftime('%Hh%M')}", inline=False)
-        embed.add_field(name="DÉBUT DANS", value=format_time_left(event_data['start_time']), inline=False)
-        embed.add_field(name=f"PARTICIPANTS (0/{self.max_participants})", value="Aucun participant pour le moment.", inline=False)
-        embed.set_image(url="https://i.imgur.com/uCgE04g.gif")
-
-        view = EventButtonsView(self.bot, event_name, event_data)
-        message = await announcement_channel_obj.send(content="@everyone", embed=embed, view=view)
-
-        event_data['message_id'] = message.id
-        db['events'][event_name] = event_data
+        await post_event_announcement(self.bot, interaction.guild.get_channel(self.announcement_channel_id), event_name, event_data)
         save_data(db)
 
         await self.message.delete()
@@ -528,31 +1458,27 @@ class CreateEventModalStep1(Modal):
     start_time = TextInput(label="Heure de début (HHhMM)", placeholder="Ex: 21h30")
     duration = TextInput(label="Durée", placeholder="Ex: 2h ou 90min")
 
-    def __init__(self, bot, is_planned: bool):
-        self.is_planned = is_planned
+    def __init__(self, bot, is_planned: bool, is_recurring: bool = False):
+        self.is_planned = is_planned or is_recurring
+        self.is_recurring = is_recurring
         title = "Configurer un événement (1/2)"
         super().__init__(title=title)
         self.bot = bot
         if self.is_planned:
-            self.date = TextInput(label="Date (JJ/MM/AAAA)", placeholder="Ex: 31/12/2025")
+            label = "Date de la première occurrence (JJ/MM/AAAA)" if is_recurring else "Date (JJ/MM/AAAA)"
+            self.date = TextInput(label=label, placeholder="Ex: 31/12/2025")
             self.add_item(self.date)
+        if self.is_recurring:
+            self.recurrence = TextInput(label="Récurrence", placeholder="Ex: quotidien, hebdo, hebdo:lun,jeu ou 3j")
+            self.add_item(self.recurrence)
 
     async def on_submit(self, interaction: discord.Interaction):
         try:
-            start_hour, start_minute = map(int, self.start_time.value.split('h'))
-            duration_str = self.duration.value.lower()
-            duration_value = int(''.join(filter(str.isdigit, duration_str)))
-            if 'min' in duration_str:
-                duration_delta = datetime.timedelta(minutes=duration_value)
-            elif 'h' in duration_str:
-                duration_delta = datetime.timedelta(hours=duration_value)
-            else:
-                raise ValueError("Format de durée invalide")
+            start_hour, start_minute = parse_hour_minute(self.start_time.value)
+            duration_delta = parse_duration(self.duration.value)
 
             if self.is_planned:
-                day, month, year = map(int, self.date.value.split('/'))
-                start_time_naive = datetime.datetime(year, month, day, start_hour, start_minute)
-                start_time_paris = USER_TIMEZONE.localize(start_time_naive)
+                start_time_paris = parse_local_datetime(self.date.value, self.start_time.value)
                 if start_time_paris < datetime.datetime.now(USER_TIMEZONE):
                     await interaction.response.send_message("La date et l'heure sont déjà passées.", ephemeral=True); return
             else:
@@ -569,49 +1495,78 @@ class CreateEventModalStep1(Modal):
                 "start_time_utc": start_time_utc,
                 "end_time_utc": end_time_utc
             }
+            if self.is_recurring:
+                step1_data['recurrence'] = parse_recurrence_rule(self.recurrence.value, start_time_paris)
             view = CreateEventViewStep2(self.bot, step1_data)
             await interaction.response.send_message("Étape 2/2: Veuillez finaliser la configuration ci-dessous.", view=view, ephemeral=True)
             message = await interaction.original_response()
             view.message = message
 
         except (ValueError, IndexError):
-            await interaction.response.send_message("Format invalide pour la date, l'heure ou la durée.", ephemeral=True)
+            await interaction.response.send_message("Format invalide pour la date, l'heure, la durée ou la récurrence.", ephemeral=True)
             return
 
 class CreateEventConfigView(View):
-    def __init__(self, bot, is_planned: bool, timeout=180):
+    def __init__(self, bot, is_planned: bool, is_recurring: bool = False, timeout=180):
         super().__init__(timeout=timeout)
         self.bot = bot
         self.is_planned = is_planned
+        self.is_recurring = is_recurring
 
     @discord.ui.button(label="Configurer", style=discord.ButtonStyle.primary, emoji="⚙️")
     async def configure_button(self, interaction: discord.Interaction, button: Button):
-        modal = CreateEventModalStep1(self.bot, self.is_planned)
+        modal = CreateEventModalStep1(self.bot, self.is_planned, self.is_recurring)
         await interaction.response.send_modal(modal)
         
 # --- Initialisation du bot ---
-bot = commands.Bot(command_prefix=BOT_PREFIX, intents=intents, help_command=None)
+bot = commands.Bot(
+    command_prefix=BOT_PREFIX, intents=intents, help_command=None,
+    member_cache_flags=member_cache_flags, chunk_guilds_at_startup=not LEAN_GATEWAY
+)
 
 @bot.event
 async def on_command(ctx):
     """Supprime le message de commande après son exécution."""
-    if ctx.guild:
+    # Le message de `!importer` est supprimé par la commande elle-même, une fois le fichier joint lu.
+    if ctx.guild and ctx.command.name != 'importer':
         try:
             await ctx.message.delete()
         except discord.Forbidden:
-            print("Le bot n'a pas la permission de supprimer des messages.")
+            logger.warning("Le bot n'a pas la permission de supprimer des messages.", extra={"guild": ctx.guild.id, "phase": "command"})
         except discord.NotFound:
             pass
 
 @bot.event
 async def on_ready():
     """Événement déclenché quand le bot est prêt."""
-    print(f"Logged in as {bot.user.name} ({bot.user.id})")
-    print("------")
-    print(f"Heure actuelle du serveur (UTC) : {datetime.datetime.now(SERVER_TIMEZONE)}")
-    print(f"Heure ajustée pour le bot (UTC) : {get_adjusted_time()}")
+    logger.info("Logged in as %s (%s)", bot.user.name, bot.user.id)
+    logger.info("Heure actuelle du serveur (UTC) : %s", datetime.datetime.now(SERVER_TIMEZONE))
+    logger.info("Heure ajustée pour le bot (UTC) : %s", get_adjusted_time())
+    trace.start(get_adjusted_time(), db)
     check_events.start()
     check_contests.start()
+    expand_recurring_events.start()
+    reminder_scheduler.rebuild(get_adjusted_time())
+    reminder_dm_worker.start()
+    dispatch_reminders.start()
+
+def _trace_argument(value):
+    """Sérialise un argument converti : les objets Discord sont enregistrés par leur ID."""
+    if isinstance(value, (discord.User, discord.Member)):
+        return {"user": value.id}
+    if isinstance(value, discord.abc.Snowflake):
+        return {"id": value.id}
+    return value
+
+@bot.event
+async def on_command_completion(ctx):
+    """Enregistre les commandes exécutées dans la trace."""
+    trace.record(
+        'command', name=ctx.command.name, content=ctx.message.content,
+        args=[_trace_argument(arg) for arg in ctx.args[1:]],
+        kwargs={key: _trace_argument(value) for key, value in ctx.kwargs.items()},
+        guild=ctx.guild.id if ctx.guild else None, channel=ctx.channel.id, user=ctx.author.id
+    )
 
 # --- Commandes du bot ---
 
@@ -629,6 +1584,73 @@ async def create_event_plan(ctx):
     view = CreateEventConfigView(bot, is_planned=True)
     await ctx.send("Cliquez pour configurer un événement planifié.", view=view, ephemeral=True, delete_after=180)
 
+@bot.command(name="create_event_recurring")
+@commands.has_permissions(administrator=True)
+async def create_event_recurring(ctx):
+    """Lance la configuration interactive d'un événement récurrent."""
+    view = CreateEventConfigView(bot, is_planned=True, is_recurring=True)
+    await ctx.send("Cliquez pour configurer un événement récurrent.", view=view, ephemeral=True, delete_after=180)
+
+@bot.command(name="recurring_list")
+@commands.has_permissions(administrator=True)
+async def recurring_list(ctx):
+    """Affiche les événements récurrents et la date de leur prochaine occurrence."""
+    if not db['templates']:
+        await ctx.send("Aucun événement récurrent.", delete_after=120)
+        return
+    embed = discord.Embed(title="Événements récurrents", color=NEON_PURPLE)
+    for template_name, template in db['templates'].items():
+        next_start_paris = datetime.datetime.fromisoformat(template['next_start']).astimezone(USER_TIMEZONE)
+        rule = template['rule']
+        if rule['freq'] == 'weekly':
+            rule_text = "Chaque " + ", ".join(WEEKDAY_NAMES[day] for day in rule['weekdays'])
+        else:
+            rule_text = f"Tous les {rule['interval']} jour(s)"
+        embed.add_field(
+            name=template_name,
+            value=f"{rule_text} à {template['start_time']}\nProchaine occurrence : {next_start_paris.strftime('%d/%m/%Y')}\nRéinscription automatique : {'OUI' if template.get('carry_over') else 'NON'}",
+            inline=False
+        )
+    await ctx.send(embed=embed, delete_after=120)
+
+@bot.command(name="recurring_stop")
+@commands.has_permissions(administrator=True)
+async def recurring_stop(ctx, *, template_name: str):
+    """Arrête un événement récurrent (les occurrences déjà annoncées sont conservées)."""
+    if template_name not in db['templates']:
+        await ctx.send(f"L'événement récurrent `{template_name}` n'existe pas.", delete_after=120)
+        return
+    del db['templates'][template_name]
+    save_data(db)
+    await ctx.send(f"L'événement récurrent `{template_name}` a été arrêté.", delete_after=120)
+
+@bot.command(name="rappels")
+@commands.has_permissions(administrator=True)
+async def rappels(ctx, name: str, *, stages: str = None):
+    """Affiche ou modifie les étapes de rappel d'un événement ou d'un concours."""
+    if name in db['events']:
+        kind, data = 'event', db['events'][name]
+    elif name in db['contests']:
+        kind, data = 'contest', db['contests'][name]
+    else:
+        await ctx.send(f"Aucun événement ou concours nommé `{name}`.", delete_after=120)
+        return
+
+    if stages is None:
+        current = data.get('reminder_stages', DEFAULT_REMINDER_STAGES_MINUTES)
+        await ctx.send(f"Rappels de `{name}` : {', '.join(format_reminder_stage(stage) for stage in current)} avant.", delete_after=120)
+        return
+
+    try:
+        data['reminder_stages'] = parse_reminder_stages(stages)
+    except ValueError:
+        await ctx.send("Format invalide. Exemple : `!rappels \"nom\" 24h,1h,10min`", delete_after=120)
+        return
+    data.setdefault('reminders_sent', [])
+    reminder_scheduler.schedule(kind, name, data, get_adjusted_time())
+    save_data(db)
+    await ctx.send(f"Rappels de `{name}` mis à jour : {', '.join(format_reminder_stage(stage) for stage in data['reminder_stages'])} avant.", delete_after=120)
+
 @bot.command(name="concours")
 @commands.has_permissions(administrator=True)
 async def concours(ctx):
@@ -636,6 +1658,234 @@ async def concours(ctx):
     view = ContestConfigView(bot)
     await ctx.send("Veuillez choisir un salon pour le concours.", view=view, ephemeral=True, delete_after=180)
 
+# --- Import en masse d'événements et de concours ---
+# Colonnes (CSV) ou clés (JSON, liste d'objets) attendues :
+#   type               : "event" ou "contest"
+#   name               : nom de l'événement ou titre du concours
+#   date, time         : JJ/MM/AAAA et HHhMM (début de l'événement ou fin du concours)
+#   channel            : ID du salon d'annonce
+#   duration, waiting_channel, role, max_participants : événements uniquement
+#   description        : concours uniquement
+#   reminders          : optionnel, étapes de rappel (ex: "24h,1h,10min")
+BULK_IMPORT_MAX_ROWS = 200
+BULK_POST_INTERVAL_SECONDS = 1.2
+BULK_PROGRESS_INTERVAL_SECONDS = 2
+
+def read_import_rows(filename, content):
+    """Lit les lignes d'un fichier d'import JSON ou CSV (séparateur ',' ou ';')."""
+    text = content.decode('utf-8-sig')
+    if filename.lower().endswith('.json'):
+        rows = json.loads(text)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("Le fichier JSON doit contenir une liste d'objets.")
+        return rows
+    if filename.lower().endswith('.csv'):
+        delimiter = ';' if text.partition('\n')[0].count(';') > text.partition('\n')[0].count(',') else ','
+        return list(csv.DictReader(io.StringIO(text), delimiter=delimiter))
+    raise ValueError("Le fichier doit être au format .json ou .csv.")
+
+def validate_import_row(row, guild, now_utc, taken_names):
+    """
+    Valide une ligne d'import et renvoie `(type, nom, données)` prêts à être publiés.
+    Lève ValueError avec un message lisible si la ligne est invalide.
+    """
+    row = {key.strip().lower(): str(value).strip() for key, value in row.items() if key and value is not None}
+    kind = row.get('type', '').lower()
+    name = row.get('name', '')
+    if kind not in ('event', 'contest'):
+        raise ValueError("type doit être 'event' ou 'contest'")
+    if not name:
+        raise ValueError("name est obligatoire")
+    if (kind, name) in taken_names:
+        raise ValueError(f"`{name}` existe déjà ou apparaît plusieurs fois")
+
+    try:
+        local_time = parse_local_datetime(row.get('date', ''), row.get('time', ''))
+    except (ValueError, IndexError):
+        raise ValueError("date/time invalides (JJ/MM/AAAA et HHhMM)")
+    time_utc = local_time.astimezone(SERVER_TIMEZONE)
+    if time_utc < now_utc:
+        raise ValueError("la date et l'heure sont déjà passées")
+
+    try:
+        channel = guild.get_channel(int(row.get('channel', '')))
+    except ValueError:
+        channel = None
+    if not channel:
+        raise ValueError("channel introuvable sur ce serveur")
+    # Les catégories et salons forum n'acceptent pas de messages.
+    if not isinstance(channel, discord.abc.Messageable):
+        raise ValueError("channel doit être un salon où le bot peut écrire")
+
+    try:
+        reminder_stages = parse_reminder_stages(row['reminders']) if row.get('reminders') else list(DEFAULT_REMINDER_STAGES_MINUTES)
+    except ValueError:
+        raise ValueError("reminders invalide (ex: 24h,1h,10min)")
+
+    if kind == 'contest':
+        return kind, name, {
+            "title": name,
+            "description": row.get('description', ''),
+            "end_time": time_utc.isoformat(),
+            "participants": [],
+            "announcement_channel_id": channel.id,
+            "message_id": None,
+            "is_finished": False,
+            "reminder_stages": reminder_stages, "reminders_sent": []
+        }
+
+    try:
+        duration_delta = parse_duration(row.get('duration', ''))
+    except ValueError:
+        raise ValueError("duration invalide (ex: 2h ou 90min)")
+    try:
+        waiting_channel = guild.get_channel(int(row.get('waiting_channel', '')))
+        role = guild.get_role(int(row.get('role', '')))
+        max_participants = int(row.get('max_participants', ''))
+    except ValueError:
+        raise ValueError("waiting_channel, role et max_participants doivent être des nombres")
+    if not waiting_channel:
+        raise ValueError("waiting_channel introuvable sur ce serveur")
+    if not role:
+        raise ValueError("role introuvable sur ce serveur")
+    if max_participants <= 0:
+        raise ValueError("max_participants doit être positif")
+
+    return kind, name, {
+        "start_time": time_utc.isoformat(),
+        "end_time": (time_utc + duration_delta).isoformat(),
+        "role_id": role.id,
+        "announcement_channel_id": channel.id,
+        "waiting_channel_id": waiting_channel.id,
+        "max_participants": max_participants,
+        "participants": [], "last_participant_count": 0, "is_started": False,
+        "message_id": None, "reminder_stages": reminder_stages, "reminders_sent": []
+    }
+
+class ImportProgress:
+    """Tient à jour un message de progression, modifié au plus toutes les BULK_PROGRESS_INTERVAL_SECONDS."""
+    def __init__(self, message, total):
+        self.message = message
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self._last_edit = 0
+
+    async def advance(self, failed=False):
+        self.done += 1
+        self.failed += failed
+        now = time.monotonic()
+        if now - self._last_edit >= BULK_PROGRESS_INTERVAL_SECONDS:
+            self._last_edit = now
+            await self.refresh()
+
+    async def refresh(self, final=False):
+        prefix = "✅ Import terminé" if final else "⏳ Import en cours"
+        text = f"{prefix} : {self.done - self.failed}/{self.total} annonces publiées."
+        if self.failed:
+            text += f" {self.failed} échec(s)."
+        try:
+            await self.message.edit(content=text)
+        except discord.HTTPException:
+            pass
+
+async def post_import_batch(bot, guild, items, progress):
+    """
+    Publie les annonces des éléments validés : les salons sont traités en parallèle, les messages
+    d'un même salon sont espacés de BULK_POST_INTERVAL_SECONDS. Chaque élément publié est aussitôt
+    enregistré dans `db` (en mémoire) et ses rappels programmés ; l'appelant sauvegarde une seule
+    fois à la fin. Renvoie (publiés, échecs).
+    """
+    by_channel = defaultdict(list)
+    for item in items:
+        by_channel[item[2]['announcement_channel_id']].append(item)
+    posted, failed = [], []
+
+    async def post_channel(channel_id, channel_items):
+        channel = guild.get_channel(channel_id)
+        for i, (kind, name, data) in enumerate(channel_items):
+            if i: await asyncio.sleep(BULK_POST_INTERVAL_SECONDS)
+            section = db['events' if kind == 'event' else 'contests']
+            try:
+                if name in section:
+                    raise ValueError("un élément du même nom a été créé pendant l'import")
+                if kind == 'event':
+                    message = await send_event_announcement(bot, channel, name, data)
+                else:
+                    message = await send_contest_announcement(bot, channel, name, data)
+                data['message_id'] = message.id
+                section[name] = data
+                reminder_scheduler.schedule(kind, name, data, get_adjusted_time())
+                posted.append((kind, name, data))
+            except Exception as e:
+                # Une ligne en échec ne doit pas empêcher l'enregistrement des annonces déjà publiées.
+                logger.warning("Impossible de publier l'annonce importée : %s", e, extra={kind: name, "guild": guild.id, "phase": "import"})
+                failed.append(name)
+                await progress.advance(failed=True)
+            else:
+                await progress.advance()
+
+    await asyncio.gather(*(post_channel(channel_id, channel_items) for channel_id, channel_items in by_channel.items()))
+    return posted, failed
+
+@bot.command(name="importer")
+@commands.has_permissions(administrator=True)
+async def importer(ctx):
+    """Importe en une fois des événements et concours depuis un fichier JSON ou CSV joint."""
+    if not ctx.message.attachments:
+        await ctx.send("Joignez un fichier `.json` ou `.csv` à la commande.", delete_after=120)
+        return
+    attachment = ctx.message.attachments[0]
+    try:
+        rows = read_import_rows(attachment.filename, await attachment.read())
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        await ctx.send(f"Fichier illisible : {e}", delete_after=120)
+        return
+    finally:
+        try:
+            await ctx.message.delete()
+        except (discord.Forbidden, discord.NotFound):
+            pass
+
+    if not rows:
+        await ctx.send("Le fichier ne contient aucune ligne.", delete_after=120)
+        return
+    if len(rows) > BULK_IMPORT_MAX_ROWS:
+        await ctx.send(f"Le fichier contient trop de lignes ({len(rows)}, maximum {BULK_IMPORT_MAX_ROWS}).", delete_after=120)
+        return
+
+    # Toutes les lignes sont validées avant toute publication.
+    now_utc = get_adjusted_time()
+    taken_names = {('event', name) for name in db['events']} | {('contest', name) for name in db['contests']}
+    items, errors = [], []
+    for line_number, row in enumerate(rows, start=1):
+        try:
+            kind, name, data = validate_import_row(row, ctx.guild, now_utc, taken_names)
+        except ValueError as e:
+            errors.append(f"- Ligne {line_number} : {e}")
+            continue
+        taken_names.add((kind, name))
+        items.append((kind, name, data))
+
+    if errors:
+        details = "\n".join(errors[:15])
+        if len(errors) > 15:
+            details += f"\n... et {len(errors) - 15} autre(s) erreur(s)."
+        await ctx.send(f"❌ Import annulé, {len(errors)} ligne(s) invalide(s) :\n{details}", delete_after=300)
+        return
+
+    progress_message = await ctx.send(f"⏳ Import en cours : 0/{len(items)} annonces publiées.")
+    progress = ImportProgress(progress_message, len(items))
+    try:
+        posted, failed = await post_import_batch(bot, ctx.guild, items, progress)
+    finally:
+        # Un seul enregistrement pour tout le lot (les éléments publiés sont déjà dans `db`).
+        save_data(db)
+
+    await progress.refresh(final=True)
+    if failed:
+        await ctx.send(f"Annonces non publiées (à recréer) : {', '.join(f'`{name}`' for name in failed)}", delete_after=300)
+
 async def _do_raffle_logic(guild, channel, admin, contest_name):
     """Logique de base pour effectuer un tirage au sort."""
     if contest_name not in db['contests']:
@@ -649,7 +1899,7 @@ async def _do_raffle_logic(guild, channel, admin, contest_name):
 
     winner_data = random.choice(participants)
     winner_id = winner_data['id']
-    winner_member = guild.get_member(winner_id)
+    winner_member = (await resolve_members(guild, [winner_id])).get(winner_id)
     
     await channel.send(f"@everyone 🎉 **Félicitations à <@{winner_id}>** ! 🎉\nVous êtes le grand gagnant du tirage au sort pour le concours **{contest_name}** !")
     
@@ -663,7 +1913,7 @@ async def _do_raffle_logic(guild, channel, admin, contest_name):
             embed_dm = discord.Embed(title="🏆VOUS AVEZ GAGNÉ UN CONCOURS !", description=f"Félicitations ! Vous avez gagné le concours **{contest_name}** !\nContactez l'administration pour réclamer votre prix.", color=NEON_BLUE)
             await winner_member.send(embed=embed_dm)
         except discord.Forbidden:
-            print(f"Impossible d'envoyer un MP au gagnant {winner_member.name}.")
+            logger.warning("Impossible d'envoyer un MP au gagnant %s.", winner_member.name, extra={"contest": contest_name, "guild": guild.id, "phase": "raffle"})
 
     try:
         message = await channel.fetch_message(contest_data['message_id'])
@@ -671,6 +1921,8 @@ async def _do_raffle_logic(guild, channel, admin, contest_name):
     except discord.NotFound: pass
     
     del db['contests'][contest_name]
+    archive_record('contest', contest_name, contest_data, 'drawn', winner=winner_id)
+    participation_stats.record(guild.id, winner_id, 'contest_wins')
     save_data(db)
     return f"Tirage au sort pour `{contest_name}` effectué avec succès."
 
@@ -707,9 +1959,82 @@ async def end_concours(ctx, contest_name: str, *, reason: str = "Raison non spé
         await announcement_channel.send(f"@everyone ❌ Le concours **{contest_name}** a été annulé.")
     
     del db['contests'][contest_name]
+    archive_record('contest', contest_name, contest_data, 'cancelled', reason=reason)
     save_data(db)
     await ctx.send(f"Le concours `{contest_name}` a été annulé.", delete_after=120)
 
+HISTORY_OUTCOME_LABELS = {
+    'finished': "terminé", 'cancelled': "annulé", 'drawn': "tiré au sort",
+    'message_deleted': "annonce supprimée", 'channel_missing': "salon introuvable", 'error': "erreur"
+}
+
+async def send_history(ctx, title, start=None, end=None, user_id=None):
+    """Recherche dans l'archive (sur le thread de l'archive) et affiche les résultats pour ce serveur."""
+    loop = asyncio.get_running_loop()
+    entries = await loop.run_in_executor(archive_executor, history_archive.query, ctx.guild.id, start, end, user_id, 20)
+    if not entries:
+        await ctx.send("Aucun élément archivé pour cette recherche.", delete_after=120)
+        return
+    lines = []
+    for entry in entries:
+        archived_paris = datetime.datetime.fromisoformat(entry['archived_at']).astimezone(USER_TIMEZONE)
+        kind = "Événement" if entry['kind'] == 'event' else "Concours"
+        line = f"- {archived_paris.strftime('%d/%m/%Y')} · {kind} **{entry['name']}** ({HISTORY_OUTCOME_LABELS.get(entry['outcome'], entry['outcome'])}, {len(entry['users'])} inscrit(s))"
+        if entry.get('winner'):
+            line += f" · gagnant <@{entry['winner']}>"
+        lines.append(line)
+    embed = discord.Embed(title=title, description="\n".join(lines), color=NEON_PURPLE)
+    await ctx.send(embed=embed, delete_after=300)
+
+def _parse_history_date(date_str):
+    day, month, year = map(int, date_str.split('/'))
+    return datetime.date(year, month, day).isoformat()
+
+@bot.command(name="historique")
+@commands.has_permissions(administrator=True)
+async def historique(ctx, start: str = None, end: str = None):
+    """Affiche les événements et concours archivés, éventuellement entre deux dates."""
+    try:
+        start_iso = _parse_history_date(start) if start else None
+        end_iso = _parse_history_date(end) if end else None
+    except ValueError:
+        await ctx.send("Format de date invalide. Utilisez 'JJ/MM/AAAA'.", delete_after=120)
+        return
+    await send_history(ctx, "Historique des événements et concours", start_iso, end_iso)
+
+@bot.command(name="historique_membre")
+@commands.has_permissions(administrator=True)
+async def historique_membre(ctx, member: discord.User):
+    """Affiche les événements et concours archivés auxquels un membre s'était inscrit."""
+    await send_history(ctx, f"Historique de {member.display_name}", user_id=member.id)
+
+LEADERBOARD_LABELS = {
+    'activity': "Activité", 'events_joined': "Inscriptions aux événements", 'events_attended': "Présences aux événements",
+    'contest_entries': "Participations aux concours", 'contest_wins': "Victoires aux concours"
+}
+
+@bot.command(name="classement")
+@commands.has_permissions(administrator=True)
+async def classement(ctx, metric: str = 'activity'):
+    """Affiche le classement du serveur pour une statistique de participation."""
+    if metric not in LEADERBOARD_METRICS:
+        await ctx.send(f"Statistique inconnue. Choisissez parmi : {', '.join(f'`{m}`' for m in LEADERBOARD_METRICS)}.", delete_after=120)
+        return
+    top = participation_stats.top(ctx.guild.id, metric)
+    lines = [f"**{rank}.** <@{user_id}> — {value}" for rank, (user_id, value) in enumerate(top, start=1)]
+    embed = discord.Embed(title=f"Classement : {LEADERBOARD_LABELS[metric]}", description="\n".join(lines) or "Aucune donnée pour le moment.", color=NEON_PURPLE)
+    await ctx.send(embed=embed, delete_after=300)
+
+@bot.command(name="stats")
+@commands.has_permissions(administrator=True)
+async def stats(ctx, member: discord.User):
+    """Affiche les statistiques de participation d'un membre."""
+    values = participation_stats.user_stats(ctx.guild.id, member.id)
+    embed = discord.Embed(title=f"Statistiques de {member.display_name}", color=NEON_PURPLE)
+    for metric in LEADERBOARD_METRICS:
+        embed.add_field(name=LEADERBOARD_LABELS[metric], value=str(values[metric]), inline=True)
+    await ctx.send(embed=embed, delete_after=300)
+
 @bot.command(name="helpoxel", aliases=["help"])
 async def help_command(ctx):
     """Affiche toutes les commandes disponibles."""
@@ -722,164 +2047,330 @@ async def help_command(ctx):
     embed.add_field(name="🎉 Commandes d'Événements (ADMIN)", value="---", inline=False)
     embed.add_field(name="`!create_event`", value="Ouvre une fenêtre pour configurer un événement pour le jour même.", inline=False)
     embed.add_field(name="`!create_event_plan`", value="Ouvre une fenêtre pour configurer un événement à une date future.", inline=False)
+    embed.add_field(name="`!create_event_recurring`", value="Ouvre une fenêtre pour configurer un événement récurrent (quotidien, hebdomadaire ou tous les N jours).", inline=False)
+    embed.add_field(name="`!recurring_list`", value="Affiche les événements récurrents et leur prochaine occurrence.", inline=False)
+    embed.add_field(name="`!recurring_stop`", value="Arrête un événement récurrent.\n*Syntaxe:* `!recurring_stop nom_de_l_evenement`", inline=False)
+    embed.add_field(name="`!importer`", value="Importe des événements et concours depuis un fichier `.json` ou `.csv` joint au message.", inline=False)
+    
+    embed.add_field(name="`!rappels`", value="Affiche ou modifie les rappels d'un événement ou d'un concours.\n*Syntaxe:* `!rappels \"nom\" 24h,1h,10min`", inline=False)
     
     embed.add_field(name="🏆 Commandes de Concours (ADMIN)", value="---", inline=False)
     embed.add_field(name="`!concours`", value="Ouvre une fenêtre pour configurer et créer un nouveau concours.", inline=False)
     embed.add_field(name="`!end_concours`", value="Annule un concours en cours.\n*Syntaxe:* `!end_concours \"nom_du_concours\" \"raison\"`", inline=False)
     embed.add_field(name="`!tirage`", value="Effectue manuellement le tirage au sort pour un concours terminé.\n*Syntaxe:* `!tirage \"nom_du_concours\"`", inline=False)
     
+    embed.add_field(name="📜 Historique et statistiques (ADMIN)", value="---", inline=False)
+    embed.add_field(name="`!historique`", value="Affiche les événements et concours terminés.\n*Syntaxe:* `!historique [JJ/MM/AAAA] [JJ/MM/AAAA]`", inline=False)
+    embed.add_field(name="`!historique_membre`", value="Affiche l'historique d'un membre.\n*Syntaxe:* `!historique_membre @membre`", inline=False)
+
+    embed.add_field(name="`!classement`", value="Affiche le classement du serveur.\n*Syntaxe:* `!classement [activity|events_joined|events_attended|contest_entries|contest_wins]`", inline=False)
+    embed.add_field(name="`!stats`", value="Affiche les statistiques de participation d'un membre.\n*Syntaxe:* `!stats @membre`", inline=False)
+
     embed.add_field(name="🛠️ Commandes Utilitaires", value="---", inline=False)
+    embed.add_field(name="`!tick_stats` (ADMIN)", value="Affiche les serveurs dont le traitement des événements et concours est le plus lent.", inline=False)
     embed.add_field(name="`!helpoxel` (ou `!help`)", value="Affiche ce message d'aide.", inline=False)
 
     await ctx.send(embed=embed, delete_after=120)
 
+@bot.command(name="tick_stats")
+@commands.has_permissions(administrator=True)
+async def tick_stats(ctx):
+    """Affiche les temps de traitement par serveur des boucles de vérification."""
+    embed = discord.Embed(title="Temps de traitement des boucles", color=NEON_PURPLE)
+    for label, runner in (("Événements", event_tick_runner), ("Concours", contest_tick_runner)):
+        lines = [f"- `{guild_id}` : {duration:.2f}s" for guild_id, duration in runner.slowest_guilds()]
+        embed.add_field(name=f"{label} ({len(runner.in_flight)} en cours)", value="\n".join(lines) or "Aucune donnée.", inline=False)
+    await ctx.send(embed=embed, delete_after=120)
+
 # --- Tâches en arrière-plan ---
 
+class TickRunner:
+    """
+    Traite les éléments d'un tick (événements ou concours) en tâches indépendantes.
+    Le nombre de tâches simultanées est limité et chaque tick dispose d'un budget de temps :
+    les tâches non terminées continuent en arrière-plan et sont reprises aux ticks suivants
+    au lieu de bloquer la boucle.
+    """
+    def __init__(self, name, log_field, max_concurrency, budget_seconds, slow_threshold_seconds, error_result=None):
+        self.name = name
+        self.log_field = log_field
+        self.error_result = error_result
+        self.budget_seconds = budget_seconds
+        self.slow_threshold_seconds = slow_threshold_seconds
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = {}
+        self.completed = []
+        self.timings = {}
+
+    async def _run_item(self, key, guild_id, process):
+        async with self.semaphore:
+            started = asyncio.get_running_loop().time()
+            try:
+                result = await process()
+            except Exception as e:
+                logger.exception("Erreur en traitant %s : %s", self.name, e, extra={self.log_field: key, "guild": guild_id, "phase": "tick"})
+                result = self.error_result
+            duration = asyncio.get_running_loop().time() - started
+        self.timings[key] = {"guild_id": guild_id, "duration": duration}
+        if duration >= self.slow_threshold_seconds:
+            logger.warning("Traitement lent (%s) en %.2fs", self.name, duration, extra={self.log_field: key, "guild": guild_id, "phase": "tick"})
+        self.completed.append((key, result))
+
+    async def run(self, items):
+        """
+        Lance `process()` pour chaque `(key, guild_id, process)` qui n'est pas déjà en cours,
+        attend au plus `budget_seconds`, puis renvoie les `(key, résultat)` terminés depuis le dernier appel.
+        Les tâches terminées entre deux ticks sont relevées avant d'en lancer de nouvelles : un élément
+        dont le traitement a déjà abouti (résultat non nul) n'est pas traité une seconde fois.
+        """
+        finished, self.completed = self.completed, []
+        concluded = {key for key, result in finished if result is not None}
+        keys = {key for key, _, _ in items}
+        self.timings = {key: timing for key, timing in self.timings.items() if key in keys}
+        for key, guild_id, process in items:
+            if key in self.in_flight or key in concluded: continue
+            task = asyncio.create_task(self._run_item(key, guild_id, process))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _, key=key: self.in_flight.pop(key, None))
+
+        if self.in_flight:
+            await asyncio.wait(list(self.in_flight.values()), timeout=self.budget_seconds)
+
+        completed, self.completed = finished + self.completed, []
+        return completed
+
+    def slowest_guilds(self, limit=5):
+        """Renvoie les serveurs dont le traitement a été le plus long lors des derniers ticks."""
+        per_guild = {}
+        for timing in self.timings.values():
+            guild_id = timing['guild_id']
+            per_guild[guild_id] = max(per_guild.get(guild_id, 0), timing['duration'])
+        return sorted(per_guild.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+TICK_MAX_CONCURRENCY = 10
+TICK_BUDGET_SECONDS = 8
+TICK_SLOW_THRESHOLD_SECONDS = 5
+event_tick_runner = TickRunner("l'événement", 'event', TICK_MAX_CONCURRENCY, TICK_BUDGET_SECONDS, TICK_SLOW_THRESHOLD_SECONDS, error_result='error')
+contest_tick_runner = TickRunner("le concours", 'contest', TICK_MAX_CONCURRENCY, TICK_BUDGET_SECONDS, TICK_SLOW_THRESHOLD_SECONDS, error_result=None)
+
+def _guild_id_for_channel(channel_id):
+    channel = bot.get_channel(channel_id)
+    return channel.guild.id if channel and getattr(channel, 'guild', None) else None
+
+async def process_event(event_name, event_data, now_utc):
+    """
+    Traite un événement pour le tick courant. Renvoie la raison de sa fin ('finished', 'cancelled',
+    'channel_missing') s'il doit être retiré et archivé, sinon None.
+    """
+    start_time_utc = datetime.datetime.fromisoformat(event_data['start_time']).replace(tzinfo=SERVER_TIMEZONE)
+    end_time_utc = datetime.datetime.fromisoformat(event_data['end_time']).replace(tzinfo=SERVER_TIMEZONE)
+    channel = bot.get_channel(event_data['announcement_channel_id'])
+    if not channel:
+        return 'channel_missing'
+    
+    # --- DÉMARRAGE DE L'ÉVÉNEMENT ---
+    if not event_data.get('is_started') and now_utc >= start_time_utc:
+        if len(event_data['participants']) < 1:
+            await channel.send(f"@everyone ❌ **ANNULATION:** L'événement **{event_name}** est annulé (pas assez de participants).")
+            try:
+                message = await channel.fetch_message(event_data['message_id'])
+                embed = message.embeds[0]
+                embed.title = f"Événement annulé: {event_name}"
+                embed.description = "Annulé (pas de participants)."
+                embed.clear_fields()
+                embed.set_image(url="")
+                await message.edit(embed=embed, view=None)
+            except discord.NotFound: pass
+            return 'cancelled'
+
+        event_data['is_started'] = True
+        if event_data.get('template'):
+            carry_over_participants(bot, event_data['template'], event_data['participants'])
+        for p in event_data['participants']:
+            participation_stats.record(channel.guild.id, p['id'], 'events_attended')
+        save_data(db)
+
+        # Mise à jour de l'embed pour "EN COURS"
+        try:
+            message = await channel.fetch_message(event_data['message_id'])
+            embed = discord.Embed(
+                title=f"Événement en cours: {event_name}",
+                description="Cet événement a officiellement commencé. Rendez-vous dans le salon de jeu !",
+                color=NEON_PURPLE
+            )
+            embed.add_field(name="ÉTAT", value="EN COURS", inline=False)
+            participants_list = "\n".join([f"- **{p['name']}**" for p in event_data['participants']])
+            embed.add_field(name=f"PARTICIPANTS ({len(event_data['participants'])})", value=participants_list, inline=False)
+            await message.edit(embed=embed, view=None)
+        except Exception as e:
+            logger.error("Impossible de mettre à jour le message de début : %s", e, extra={"event": event_name, "guild": channel.guild.id, "phase": "start"})
+
+        guild = channel.guild
+        role = guild.get_role(event_data['role_id'])
+        members = await resolve_members(guild, [p['id'] for p in event_data['participants']])
+        for p in event_data['participants']:
+            member = members.get(p['id'])
+            if member and role: 
+                await member.add_roles(role)
+                try:
+                    await member.send(f"🎉 **L'événement `{event_name}` a démarré !** Le rôle `{role.name}` vous a été attribué. Rendez-vous dans le salon <#{event_data['waiting_channel_id']}>.")
+                except discord.Forbidden:
+                    logger.warning("Impossible d'envoyer un MP à %s (DMs bloqués).", member.display_name, extra={"event": event_name, "guild": guild.id, "phase": "start_dm"})
+
+    # --- FIN DE L'ÉVÉNEMENT ---
+    elif event_data.get('is_started') and now_utc >= end_time_utc:
+        await channel.send(f"@everyone L'événement **{event_name}** est terminé. Merci d'avoir participé ! 🎉")
+        
+        try:
+            message = await channel.fetch_message(event_data['message_id'])
+            embed = message.embeds[0]
+            embed.title = f"Événement terminé: {event_name}"
+            embed.description = "Cet événement est maintenant terminé. Merci à tous les participants !"
+            embed.clear_fields()
+            embed.add_field(name="ÉTAT", value="TERMINÉ", inline=False)
+            await message.edit(embed=embed, view=None)
+        except Exception as e:
+             logger.error("Impossible de mettre à jour le message de fin : %s", e, extra={"event": event_name, "guild": channel.guild.id, "phase": "end"})
+
+        guild = channel.guild
+        role = guild.get_role(event_data['role_id'])
+        members = await resolve_members(guild, [p['id'] for p in event_data['participants']])
+        for p in event_data['participants']:
+            member = members.get(p['id'])
+            if member and role: await member.remove_roles(role)
+        return 'finished'
+
+    # --- MISE À JOUR CONTINUE DU COMPTE À REBOURS ---
+    elif not event_data.get('is_started'):
+        await update_event_embed(bot, event_name)
+
+    return None
+
 @tasks.loop(seconds=10)
 async def check_events():
     """Vérifie l'état de tous les événements en temps réel."""
     now_utc = get_adjusted_time()
-    events_to_delete = []
-    for event_name, event_data in list(db['events'].items()):
+    completed = await event_tick_runner.run([
+        (event_name, _guild_id_for_channel(event_data['announcement_channel_id']),
+         lambda event_name=event_name, event_data=event_data: process_event(event_name, event_data, now_utc))
+        for event_name, event_data in list(db['events'].items())
+    ])
+    trace.record('tick', loop='events', items=len(db['events']), completed=len(completed), in_flight=len(event_tick_runner.in_flight))
+
+    events_to_delete = [(event_name, outcome) for event_name, outcome in completed if outcome]
+    if events_to_delete:
+        for event_name, outcome in events_to_delete:
+            if event_name in db['events']:
+                archive_record('event', event_name, db['events'].pop(event_name), outcome)
+        save_data(db)
+
+async def process_contest(contest_name, contest_data, now_utc):
+    """
+    Traite un concours pour le tick courant. Renvoie la raison de sa fin ('cancelled', 'message_deleted')
+    s'il doit être retiré et archivé, sinon None.
+    """
+    end_time_utc = datetime.datetime.fromisoformat(contest_data['end_time']).replace(tzinfo=SERVER_TIMEZONE)
+    outcome = None
+
+    if now_utc < end_time_utc and not contest_data.get('is_finished'):
+        await update_contest_embed(bot, contest_name)
+
+    elif now_utc >= end_time_utc and not contest_data.get('is_finished'):
+        channel = bot.get_channel(contest_data['announcement_channel_id'])
+        if not channel: return None
+        
         try:
-            start_time_utc = datetime.datetime.fromisoformat(event_data['start_time']).replace(tzinfo=SERVER_TIMEZONE)
-            end_time_utc = datetime.datetime.fromisoformat(event_data['end_time']).replace(tzinfo=SERVER_TIMEZONE)
-            channel = bot.get_channel(event_data['announcement_channel_id'])
-            if not channel:
-                events_to_delete.append(event_name)
-                continue
+            message = await channel.fetch_message(contest_data['message_id'])
+            embed = message.embeds[0]
             
-            # --- RAPPEL 30 MINUTES AVANT L'ÉVÉNEMENT ---
-            if not event_data.get('reminded_30m') and (start_time_utc - now_utc).total_seconds() <= 30 * 60 and start_time_utc > now_utc:
-                await channel.send(f"@everyone ⏰ **RAPPEL:** L'événement **{event_name}** commence dans 30 minutes ! N'oubliez pas de vous inscrire.")
-                event_data['reminded_30m'] = True
-                save_data(db)
-
-            # --- DÉMARRAGE DE L'ÉVÉNEMENT ---
-            if not event_data.get('is_started') and now_utc >= start_time_utc:
-                if len(event_data['participants']) < 1:
-                    await channel.send(f"@everyone ❌ **ANNULATION:** L'événement **{event_name}** est annulé (pas assez de participants).")
-                    try:
-                        message = await channel.fetch_message(event_data['message_id'])
-                        embed = message.embeds[0]
-                        embed.title = f"Événement annulé: {event_name}"
-                        embed.description = "Annulé (pas de participants)."
-                        embed.clear_fields()
-                        embed.set_image(url="")
-                        await message.edit(embed=embed, view=None)
-                    except discord.NotFound: pass
-                    events_to_delete.append(event_name)
-                    continue
-
-                event_data['is_started'] = True
-                save_data(db)
+            if not contest_data['participants']:
+                embed.title = f"Concours annulé: {contest_name}"
+                embed.description = "Ce concours a été annulé car personne ne s'y est inscrit."
+                embed.clear_fields()
+                embed.add_field(name="INSCRITS", value="Aucun participant", inline=False)
+                embed.add_field(name="FIN DU CONCOURS", value="\u200b", inline=False) # \u200b is a zero-width space to make the field value appear empty
+                await message.edit(embed=embed, view=None)
+                await channel.send(f"@everyone ❌ Le concours **{contest_name}** a été annulé (aucun participant).")
+                outcome = 'cancelled'
+            else:
+                embed.title = f"Concours terminé: {contest_name}"
+                embed.description = "Ce concours est maintenant terminé !"
+                embed.clear_fields()
+                embed.add_field(name="ÉTAT", value="TERMINÉ", inline=False)
+                admin_view = TirageAdminView(contest_name)
+                await message.edit(embed=embed, view=admin_view)
+                await channel.send(f"@everyone Le concours **{contest_name}** est terminé. Le tirage au sort va bientôt avoir lieu.")
+            
+            contest_data['is_finished'] = True
+            save_data(db)
+        except discord.NotFound:
+            outcome = 'message_deleted'
 
-                # Mise à jour de l'embed pour "EN COURS"
-                try:
-                    message = await channel.fetch_message(event_data['message_id'])
-                    embed = discord.Embed(
-                        title=f"Événement en cours: {event_name}",
-                        description="Cet événement a officiellement commencé. Rendez-vous dans le salon de jeu !",
-                        color=NEON_PURPLE
-                    )
-                    embed.add_field(name="ÉTAT", value="EN COURS", inline=False)
-                    participants_list = "\n".join([f"- **{p['name']}**" for p in event_data['participants']])
-                    embed.add_field(name=f"PARTICIPANTS ({len(event_data['participants'])})", value=participants_list, inline=False)
-                    await message.edit(embed=embed, view=None)
-                except Exception as e:
-                    print(f"Impossible de mettre à jour le message pour le début de l'événement {event_name}: {e}")
-
-                guild = channel.guild
-                role = guild.get_role(event_data['role_id'])
-                for p in event_data['participants']:
-                    member = guild.get_member(p['id'])
-                    if member and role: 
-                        await member.add_roles(role)
-                        try:
-                            await member.send(f"🎉 **L'événement `{event_name}` a démarré !** Le rôle `{role.name}` vous a été attribué. Rendez-vous dans le salon <#{event_data['waiting_channel_id']}>.")
-                        except discord.Forbidden:
-                            print(f"Impossible d'envoyer un MP à {member.display_name} (DMs bloqués).")
-
-            # --- FIN DE L'ÉVÉNEMENT ---
-            elif event_data.get('is_started') and now_utc >= end_time_utc:
-                await channel.send(f"@everyone L'événement **{event_name}** est terminé. Merci d'avoir participé ! 🎉")
-                
-                try:
-                    message = await channel.fetch_message(event_data['message_id'])
-                    embed = message.embeds[0]
-                    embed.title = f"Événement terminé: {event_name}"
-                    embed.description = "Cet événement est maintenant terminé. Merci à tous les participants !"
-                    embed.clear_fields()
-                    embed.add_field(name="ÉTAT", value="TERMINÉ", inline=False)
-                    await message.edit(embed=embed, view=None)
-                except Exception as e:
-                     print(f"Impossible de mettre à jour le message pour la fin de l'événement {event_name}: {e}")
-
-                guild = channel.guild
-                role = guild.get_role(event_data['role_id'])
-                for p in event_data['participants']:
-                    member = guild.get_member(p['id'])
-                    if member and role: await member.remove_roles(role)
-                events_to_delete.append(event_name)
-
-            # --- MISE À JOUR CONTINUE DU COMPTE À REBOURS ---
-            elif not event_data.get('is_started'):
-                await update_event_embed(bot, event_name)
+    return outcome
 
+@tasks.loop(minutes=1)
+async def expand_recurring_events():
+    """Crée les occurrences des événements récurrents qui entrent dans l'horizon de planification."""
+    now_utc = get_adjusted_time()
+    changed = False
+    for template_name, template in list(db['templates'].items()):
+        try:
+            changed = await expand_template(bot, template_name, template, now_utc) or changed
         except Exception as e:
-            print(f"Erreur en traitant l'événement {event_name}: {e}")
-            events_to_delete.append(event_name)
-
-    if events_to_delete:
-        for event_name in events_to_delete:
-            if event_name in db['events']: del db['events'][event_name]
+            logger.exception("Erreur lors de la création d'une occurrence : %s", e, extra={"event": template_name, "phase": "recurrence"})
+    if changed:
         save_data(db)
+    trace.record('tick', loop='recurrence', items=len(db['templates']), changed=changed)
 
-@tasks.loop(seconds=10)
-async def check_contests():
-    """Vérifie l'état des concours et les termine si nécessaire."""
+@tasks.loop(seconds=15)
+async def dispatch_reminders():
+    """Envoie les rappels arrivés à échéance, regroupés par salon."""
     now_utc = get_adjusted_time()
-    contests_to_delete = []
-    for contest_name, contest_data in list(db['contests'].items()):
-        end_time_utc = datetime.datetime.fromisoformat(contest_data['end_time']).replace(tzinfo=SERVER_TIMEZONE)
+    due = {}
+    for _, kind, name, stage in reminder_scheduler.pop_due(now_utc, REMINDER_BATCH_WINDOW_SECONDS):
+        data = _pending_reminder_data(kind, name, stage)
+        if data is None: continue
+        data['reminders_sent'].append(stage)
+        # Si plusieurs étapes d'un même élément tombent ensemble, seule la plus proche est annoncée.
+        if (kind, name) not in due or stage < due[(kind, name)][2]:
+            due[(kind, name)] = (kind, name, stage, data)
+    trace.record('tick', loop='reminders', due=len(due), queued_dms=reminder_dm_worker.queue.qsize())
+    if not due: return
+    save_data(db)
 
-        if now_utc < end_time_utc and not contest_data.get('is_finished'):
-            await update_contest_embed(bot, contest_name)
+    by_channel = defaultdict(list)
+    for reminder in due.values():
+        by_channel[reminder[3]['announcement_channel_id']].append(reminder)
 
-        elif now_utc >= end_time_utc and not contest_data.get('is_finished'):
-            channel = bot.get_channel(contest_data['announcement_channel_id'])
-            if not channel: continue
-            
-            try:
-                message = await channel.fetch_message(contest_data['message_id'])
-                embed = message.embeds[0]
-                
-                if not contest_data['participants']:
-                    embed.title = f"Concours annulé: {contest_name}"
-                    embed.description = "Ce concours a été annulé car personne ne s'y est inscrit."
-                    embed.clear_fields()
-                    embed.add_field(name="INSCRITS", value="Aucun participant", inline=False)
-                    embed.add_field(name="FIN DU CONCOURS", value="\u200b", inline=False) # \u200b is a zero-width space to make the field value appear empty
-                    await message.edit(embed=embed, view=None)
-                    await channel.send(f"@everyone ❌ Le concours **{contest_name}** a été annulé (aucun participant).")
-                    contests_to_delete.append(contest_name)
-                else:
-                    embed.title = f"Concours terminé: {contest_name}"
-                    embed.description = "Ce concours est maintenant terminé !"
-                    embed.clear_fields()
-                    embed.add_field(name="ÉTAT", value="TERMINÉ", inline=False)
-                    admin_view = TirageAdminView(contest_name)
-                    await message.edit(embed=embed, view=admin_view)
-                    await channel.send(f"@everyone Le concours **{contest_name}** est terminé. Le tirage au sort va bientôt avoir lieu.")
-                
-                contest_data['is_finished'] = True
-                save_data(db)
-            except discord.NotFound:
-                contests_to_delete.append(contest_name)
+    async def send_channel_reminders(channel_id, reminders):
+        channel = bot.get_channel(channel_id)
+        if not channel: return
+        try:
+            await channel.send(format_reminder_message(reminders))
+        except discord.HTTPException as e:
+            logger.warning("Impossible d'envoyer les rappels : %s", e, extra={"guild": channel.guild.id, "phase": "reminder"})
+        for kind, name, stage, data in reminders:
+            if kind == 'event' and data['participants']:
+                await reminder_dm_worker.enqueue_event(channel.guild, name, stage, data)
+
+    await asyncio.gather(*(send_channel_reminders(channel_id, reminders) for channel_id, reminders in by_channel.items()))
 
+@tasks.loop(seconds=10)
+async def check_contests():
+    """Vérifie l'état des concours et les termine si nécessaire."""
+    now_utc = get_adjusted_time()
+    completed = await contest_tick_runner.run([
+        (contest_name, _guild_id_for_channel(contest_data['announcement_channel_id']),
+         lambda contest_name=contest_name, contest_data=contest_data: process_contest(contest_name, contest_data, now_utc))
+        for contest_name, contest_data in list(db['contests'].items())
+    ])
+    trace.record('tick', loop='contests', items=len(db['contests']), completed=len(completed), in_flight=len(contest_tick_runner.in_flight))
+
+    contests_to_delete = [(contest_name, outcome) for contest_name, outcome in completed if outcome]
     if contests_to_delete:
-        for contest_name in contests_to_delete:
-            if contest_name in db['contests']: del db['contests'][contest_name]
+        for contest_name, outcome in contests_to_delete:
+            if contest_name in db['contests']:
+                archive_record('contest', contest_name, db['contests'].pop(contest_name), outcome)
         save_data(db)
 
 if __name__ == "__main__":
@@ -0,0 +1,412 @@
+# Rejeu déterministe d'une trace enregistrée par le bot (POXEL_TRACE_FILE)
+#
+# Utilisation :
+#   python replay.py trace.jsonl --speed 10 --report build_b.json --baseline build_a.json
+#
+# La trace est rejouée contre un faux backend Discord local : aucune requête réseau n'est
+# envoyée, chaque appel d'API est compté. Le rapport donne, par type d'entrée, la latence
+# des gestionnaires et le nombre d'appels d'API, ainsi que l'écart avec un rapport de référence.
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import discord
+
+# --- Faux backend Discord ---
+
+class FakeBackend:
+    """Objets Discord simulés et compteur des appels d'API, classés par type d'entrée en cours."""
+    def __init__(self):
+        self.ids = itertools.count(10**17)
+        self.guilds = {}
+        self.channels = {}
+        self.current_kind = 'startup'
+        self.api_calls = defaultdict(int)
+
+    def call(self, name):
+        self.api_calls[(self.current_kind, name)] += 1
+
+    def guild(self, guild_id):
+        if guild_id not in self.guilds:
+            self.guilds[guild_id] = FakeGuild(self, guild_id)
+        return self.guilds[guild_id]
+
+    def get_channel(self, channel_id, guild_id=None):
+        if channel_id is None: return None
+        if channel_id not in self.channels:
+            self.channels[channel_id] = FakeChannel(self, channel_id, self.guild(guild_id or 0))
+        return self.channels[channel_id]
+
+class FakeRole:
+    def __init__(self, role_id):
+        self.id = role_id
+        self.name = f"role-{role_id}"
+        self.mention = f"<@&{role_id}>"
+
+class FakeGuild:
+    def __init__(self, backend, guild_id):
+        self.backend = backend
+        self.id = guild_id
+        self.members = {}
+
+    def get_member(self, user_id):
+        if user_id not in self.members:
+            self.members[user_id] = FakeMember(self.backend, self, user_id, f"user-{user_id}")
+        return self.members[user_id]
+
+    def get_role(self, role_id):
+        return FakeRole(role_id)
+
+    def get_channel(self, channel_id):
+        return self.backend.get_channel(channel_id, self.id)
+
+    async def query_members(self, user_ids, limit, cache):
+        self.backend.call('query_members')
+        return [self.get_member(user_id) for user_id in user_ids]
+
+class FakeMember:
+    def __init__(self, backend, guild, user_id, name):
+        self.backend = backend
+        self.guild = guild
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.mention = f"<@{user_id}>"
+        self.guild_permissions = discord.Permissions.all()
+
+    async def add_roles(self, *roles):
+        self.backend.call('add_roles')
+
+    async def remove_roles(self, *roles):
+        self.backend.call('remove_roles')
+
+    async def send(self, *args, **kwargs):
+        self.backend.call('dm_send')
+
+class FakeMessage:
+    def __init__(self, backend, channel, message_id, embed=None):
+        self.backend = backend
+        self.channel = channel
+        self.id = message_id
+        self.embeds = [embed or discord.Embed()]
+
+    async def edit(self, embed=None, **kwargs):
+        self.backend.call('message_edit')
+        if embed is not None:
+            self.embeds = [embed]
+
+    async def delete(self):
+        self.backend.call('message_delete')
+
+class FakeChannel(discord.abc.Messageable):
+    def __init__(self, backend, channel_id, guild):
+        self.backend = backend
+        self.id = channel_id
+        self.guild = guild
+        self.mention = f"<#{channel_id}>"
+        self.messages = {}
+
+    async def send(self, content=None, embed=None, **kwargs):
+        self.backend.call('channel_send')
+        message = FakeMessage(self.backend, self, next(self.backend.ids), embed)
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id):
+        self.backend.call('fetch_message')
+        if message_id not in self.messages:
+            self.messages[message_id] = FakeMessage(self.backend, self, message_id)
+        return self.messages[message_id]
+
+class FakeResponse:
+    def __init__(self, backend):
+        self.backend = backend
+        self.modal = None
+
+    async def send_message(self, *args, **kwargs):
+        self.backend.call('interaction_response')
+
+    async def send_modal(self, modal):
+        self.backend.call('interaction_response')
+        self.modal = modal
+
+    async def defer(self, *args, **kwargs):
+        self.backend.call('interaction_response')
+
+    async def edit_message(self, *args, **kwargs):
+        self.backend.call('interaction_response')
+
+class FakeFollowup:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def send(self, *args, **kwargs):
+        self.backend.call('followup_send')
+
+class FakeInteraction:
+    def __init__(self, backend, guild_id, channel_id, user_id, name=None):
+        self.backend = backend
+        self.guild = backend.guild(guild_id)
+        self.guild_id = guild_id
+        self.channel = backend.get_channel(channel_id, guild_id)
+        self.channel_id = channel_id
+        self.user = self.guild.get_member(user_id)
+        if name:
+            self.user.name = self.user.display_name = name
+        self.response = FakeResponse(backend)
+        self.followup = FakeFollowup(backend)
+
+    async def original_response(self):
+        return FakeMessage(self.backend, self.channel, next(self.backend.ids))
+
+class FakeContext:
+    def __init__(self, backend, guild_id, channel_id, user_id):
+        self.guild = backend.guild(guild_id) if guild_id is not None else None
+        self.channel = backend.get_channel(channel_id, guild_id)
+        self.author = backend.guild(guild_id).get_member(user_id)
+        self.message = FakeMessage(backend, self.channel, next(backend.ids))
+
+    async def send(self, *args, **kwargs):
+        return await self.channel.send(*args, **kwargs)
+
+# --- Rejeu ---
+
+class VirtualClock:
+    """Horloge du rejeu : l'heure de début de la trace plus le décalage de l'entrée en cours."""
+    def __init__(self, start):
+        self.start = start
+        self.offset = 0.0
+
+    def now(self):
+        return self.start + datetime.timedelta(seconds=self.offset)
+
+def _set_text(text_input, value):
+    text_input._value = value
+
+def _replay_argument(ctx, value):
+    """Reconstruit un argument de commande enregistré par ID (voir `_trace_argument` dans app.py)."""
+    if isinstance(value, dict) and 'user' in value:
+        return ctx.guild.get_member(value['user'])
+    return value
+
+class Replayer:
+    def __init__(self, app, backend, speed):
+        self.app = app
+        self.backend = backend
+        self.speed = speed
+        self.latencies = defaultdict(list)
+        self.skipped = defaultdict(int)
+
+    def _event_channel_guild(self, event_name):
+        event = self.app.db['events'].get(event_name)
+        if not event: return None, None
+        channel = self.backend.get_channel(event['announcement_channel_id'])
+        return channel.id, channel.guild.id
+
+    def _contest_channel_guild(self, contest_name):
+        contest = self.app.db['contests'].get(contest_name)
+        if not contest: return None, None
+        channel = self.backend.get_channel(contest['announcement_channel_id'])
+        return channel.id, channel.guild.id
+
+    async def handle(self, entry):
+        """Rejoue une entrée ; renvoie False si elle ne s'applique pas à l'état courant."""
+        app, kind = self.app, entry['k']
+        if kind in ('join_click', 'join_submit', 'quit_click'):
+            channel_id, guild_id = self._event_channel_guild(entry['event'])
+            if channel_id is None: return False
+            interaction = FakeInteraction(self.backend, guild_id, channel_id, entry['user'], entry.get('name'))
+            view = app.EventButtonsView(app.bot, entry['event'], app.db['events'][entry['event']])
+            if kind == 'join_click':
+                await view.on_join_click(interaction)
+            elif kind == 'quit_click':
+                await view.on_quit_click(interaction)
+            else:
+                modal = app.ParticipantModal(view, entry['event'])
+                _set_text(modal.game_pseudo, entry.get('pseudo'))
+                await modal.on_submit(interaction)
+        elif kind == 'contest_join':
+            channel_id, guild_id = self._contest_channel_guild(entry['contest'])
+            if channel_id is None: return False
+            interaction = FakeInteraction(self.backend, guild_id, channel_id, entry['user'], entry.get('name'))
+            view = app.ContestButtonsView(app.bot, entry['contest'], app.db['contests'][entry['contest']])
+            await view.on_start_click(interaction)
+        elif kind == 'contest_create':
+            interaction = FakeInteraction(self.backend, entry['guild'], entry['channel'], entry['user'])
+            modal = app.ContestConfigModal(app.bot, entry['channel'])
+            _set_text(modal.title_input, entry['title'])
+            _set_text(modal.description_input, entry['description'])
+            _set_text(modal.end_date_str, entry['end_date'])
+            _set_text(modal.end_time_str, entry['end_time'])
+            await modal.on_submit(interaction)
+        elif kind == 'event_create':
+            interaction = FakeInteraction(self.backend, entry['guild'], entry['announce'], entry['user'])
+            view = app.CreateEventViewStep2(app.bot, {
+                "event_name": entry['event'],
+                "start_time_utc": datetime.datetime.fromisoformat(entry['start']),
+                "end_time_utc": datetime.datetime.fromisoformat(entry['end']),
+                "recurrence": entry.get('recurrence')
+            })
+            view.announcement_channel_id = entry['announce']
+            view.waiting_channel_id = entry['waiting']
+            view.role_id = entry['role']
+            view.max_participants = entry['max']
+            view.carry_over = entry.get('carry_over', False)
+            view.message = FakeMessage(self.backend, interaction.channel, next(self.backend.ids))
+            await view.confirm_callback(interaction)
+        elif kind == 'raffle_click':
+            interaction = FakeInteraction(self.backend, entry['guild'], entry['channel'], entry['user'])
+            view = app.TirageAdminView(entry['contest'])
+            await view.raffle_button.callback(interaction)
+        elif kind == 'command':
+            command = app.bot.get_command(entry['name'])
+            if not command: return False
+            ctx = FakeContext(self.backend, entry['guild'], entry['channel'], entry['user'])
+            args = [_replay_argument(ctx, arg) for arg in entry['args']]
+            kwargs = {key: _replay_argument(ctx, value) for key, value in entry['kwargs'].items()}
+            await command.callback(ctx, *args, **kwargs)
+        elif kind == 'tick':
+            loops = {
+                'events': app.check_events, 'contests': app.check_contests,
+                'recurrence': app.expand_recurring_events, 'reminders': app.dispatch_reminders
+            }
+            if entry['loop'] not in loops: return False
+            await loops[entry['loop']]()
+            if entry['loop'] == 'reminders':
+                # Les MP espacés sont comptés avec le tick de rappels qui les a mis en file.
+                await app.reminder_dm_worker.queue.join()
+        else:
+            return False
+        return True
+
+    async def run(self, entries, clock):
+        replay_started = time.monotonic()
+        for entry in entries:
+            if self.speed > 0:
+                delay = entry['t'] / self.speed - (time.monotonic() - replay_started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            clock.offset = entry['t']
+            self.backend.current_kind = entry['k']
+            started = time.perf_counter()
+            try:
+                applied = await self.handle(entry)
+            except Exception as e:
+                print(f"Erreur lors du rejeu de l'entrée {entry}: {e}", file=sys.stderr)
+                applied = False
+            if applied:
+                self.latencies[entry['k']].append(time.perf_counter() - started)
+            else:
+                self.skipped[entry['k']] += 1
+            await asyncio.sleep(0)
+
+        # Laisse les mises à jour groupées et les tâches de tick en cours se terminer.
+        self.backend.current_kind = 'background'
+        await asyncio.sleep(self.app.embed_refresher.delay + 0.1)
+        for runner in (self.app.event_tick_runner, self.app.contest_tick_runner):
+            if runner.in_flight:
+                await asyncio.wait(list(runner.in_flight.values()))
+        await self.app.reminder_dm_worker.queue.join()
+
+    def report(self):
+        kinds = sorted(set(self.latencies) | set(self.skipped) | {kind for kind, _ in self.backend.api_calls})
+        report = {}
+        for kind in kinds:
+            latencies = sorted(self.latencies.get(kind, []))
+            calls = {name: count for (call_kind, name), count in self.backend.api_calls.items() if call_kind == kind}
+            report[kind] = {
+                "count": len(latencies),
+                "skipped": self.skipped.get(kind, 0),
+                "latency_p50_ms": round(statistics.median(latencies) * 1000, 3) if latencies else None,
+                "latency_p95_ms": round(latencies[math.ceil(0.95 * len(latencies)) - 1] * 1000, 3) if latencies else None,
+                "latency_max_ms": round(latencies[-1] * 1000, 3) if latencies else None,
+                "api_calls": sum(calls.values()),
+                "api_calls_by_type": calls
+            }
+        return report
+
+def compare_reports(baseline, current):
+    """Renvoie, par type d'entrée, l'écart de latence p95 et d'appels d'API par rapport à la référence."""
+    deltas = {}
+    for kind in sorted(set(baseline) | set(current)):
+        old, new = baseline.get(kind, {}), current.get(kind, {})
+        old_p95, new_p95 = old.get('latency_p95_ms'), new.get('latency_p95_ms')
+        deltas[kind] = {
+            "latency_p95_ms": round(new_p95 - old_p95, 3) if old_p95 is not None and new_p95 is not None else None,
+            "api_calls": new.get('api_calls', 0) - old.get('api_calls', 0)
+        }
+    return deltas
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    if not entries or entries[0]['k'] != 'start':
+        raise ValueError("La trace doit commencer par une entrée 'start'.")
+    return entries[0], entries[1:]
+
+async def replay(trace_path, speed, seed):
+    header, entries = load_trace(trace_path)
+
+    # Le bot lit et écrit sa base dans le répertoire courant : on isole le rejeu.
+    os.chdir(tempfile.mkdtemp(prefix='poxel-replay-'))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+
+    random.seed(seed)
+    backend = FakeBackend()
+    clock = VirtualClock(datetime.datetime.fromisoformat(header['time']))
+    app.db.clear()
+    app.db.update(header['db'])
+    # Les traces enregistrées par des versions antérieures n'ont pas toutes les sections de `db`.
+    for section in ('events', 'contests', 'templates', 'stats'):
+        app.db.setdefault(section, {})
+    app.participation_stats = app.ParticipationStats(app.db['stats'])
+    app.get_adjusted_time = clock.now
+    app.bot.get_channel = backend.get_channel
+    # La fenêtre de regroupement des embeds suit l'accélération du rejeu.
+    app.embed_refresher.delay = app.embed_refresher.delay / speed if speed > 0 else 0
+    # Comme au démarrage du bot : échéances de rappel reconstruites et file des MP démarrée.
+    app.reminder_scheduler.rebuild(clock.now())
+    app.reminder_dm_worker.interval_seconds = app.reminder_dm_worker.interval_seconds / speed if speed > 0 else 0
+    app.reminder_dm_worker.start()
+
+    replayer = Replayer(app, backend, speed)
+    await replayer.run(entries, clock)
+    return replayer.report()
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejoue une trace Poxel contre un faux backend Discord.")
+    parser.add_argument('trace', help="Fichier de trace (POXEL_TRACE_FILE)")
+    parser.add_argument('--speed', type=float, default=0, help="Facteur d'accélération (1 = temps réel, 0 = sans attente)")
+    parser.add_argument('--seed', type=int, default=0, help="Graine du tirage au sort")
+    parser.add_argument('--report', help="Fichier où écrire le rapport JSON")
+    parser.add_argument('--baseline', help="Rapport de référence à comparer")
+    args = parser.parse_args()
+
+    trace_path = os.path.abspath(args.trace)
+    report_path = os.path.abspath(args.report) if args.report else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    report = asyncio.run(replay(trace_path, args.speed, args.seed))
+    output = {"report": report}
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            output["delta"] = compare_reports(json.load(f)['report'], report)
+
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=4)
+    print(json.dumps(output, indent=4, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()